@@ -1,6 +1,8 @@
 from django.contrib import admin
 
 from apps.icms.models import NCM, ICMSRate, NCMGroup, State
+from apps.icms.services.icms_service import ICMSService
+from apps.margin.services.repricing_service import RepricingService
 
 
 @admin.register(State)
@@ -39,7 +41,32 @@ class ICMSRateAdmin(admin.ModelAdmin):
         "difal_rate",
         "poverty_rate",
         "total_rate",
+        "valid_from",
+        "valid_to",
     )
     search_fields = ("state__name", "group__name")
-    ordering = ("state", "group")
+    ordering = ("state", "group", "-valid_from")
     list_filter = ("state", "group")
+    readonly_fields = ("total_rate", "valid_to")
+    actions = ["reprice_contracts"]
+
+    def save_model(self, request, obj, form, change):
+        pairs = {(obj.state_id, obj.group_id)}
+        if change:
+            pairs.add((form.initial["state"], form.initial["group"]))
+        super().save_model(request, obj, form, change)
+        ICMSService.sync_valid_to(pairs)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ICMSService.sync_valid_to({(obj.state_id, obj.group_id)})
+
+    @admin.action(description="Reprecificar contratos afetados")
+    def reprice_contracts(self, request, queryset):
+        service = RepricingService()
+        job = service.create_job(
+            "Alteração de ICMS",
+            state_groups=list(queryset.values_list("state_id", "group_id")),
+        )
+        service.start_in_background(job)
+        self.message_user(request, f"Reprecificação {job.pk} iniciada.")
@@ -1,15 +1,23 @@
 import uuid
+from datetime import date
 from http import HTTPStatus
+from typing import Optional
 
-from ninja import Router
+from ninja import File, Form, Query, Router
+from ninja.files import UploadedFile
 
 from apps.icms.schema import (
     ICMSRateBulkCreateSchema,
     ICMSRateBulkUpdateSchema,
+    ICMSRateBulkUpsertResultSchema,
     ICMSRateCreateSchema,
+    ICMSRateImportResultSchema,
     ICMSRateListSchema,
+    ICMSRateMatrixSchema,
     ICMSRateSchema,
     ICMSRateUpdateSchema,
+    NCMBulkCreateSchema,
+    NCMBulkResultSchema,
     NCMGroupCreateSchema,
     NCMGroupListSchema,
     NCMGroupSchema,
@@ -18,17 +26,22 @@ from apps.icms.schema import (
     NCMSCreateSchema,
     NCMSListchema,
     NCMSUpdateSchema,
+    ReferenceCacheStatsSchema,
     StateListSchema,
     StateSchema,
 )
+from apps.icms.services.icms_import_service import ICMSImportService
 from apps.icms.services.icms_service import ICMSService
 from apps.icms.services.ncm_service import NCMService
 from apps.icms.services.state_service import StateService
-from utils.base_schema import ErrorSchema
+from utils.base_schema import ErrorSchema, PaginationQuerySchema
 from utils.jwt import JWTAuth, decode_jwt_token
+from utils.query_budget import query_budget
+from utils.reference_cache import reference_cache
 
 icms_router = Router(auth=JWTAuth())
 icms_service = ICMSService()
+icms_import_service = ICMSImportService()
 
 ncm_router = Router(auth=JWTAuth())
 ncm_service = NCMService()
@@ -38,11 +51,17 @@ state_service = StateService()
 
 
 @state_router.get(
-    "", response={HTTPStatus.OK: StateListSchema, HTTPStatus.FORBIDDEN: ErrorSchema}
+    "",
+    response={
+        HTTPStatus.OK: StateListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_states(request):
+@query_budget(2)
+def list_states(request, page: PaginationQuerySchema = Query(...)):
     decode_jwt_token(request.headers.get("Authorization"))
-    return state_service.list_states()
+    return state_service.list_states(**page.dict())
 
 
 @state_router.get(
@@ -53,6 +72,7 @@ def list_states(request):
         HTTPStatus.FORBIDDEN: ErrorSchema,
     },
 )
+@query_budget(1)
 def get_state(request, state_id: uuid.UUID):
     decode_jwt_token(request.headers.get("Authorization"))
     return state_service.get_state(state_id)
@@ -74,11 +94,16 @@ def create_ncm_group(request, payload: NCMGroupCreateSchema):
 
 @ncm_router.get(
     "/groups",
-    response={HTTPStatus.OK: NCMGroupListSchema, HTTPStatus.FORBIDDEN: ErrorSchema},
+    response={
+        HTTPStatus.OK: NCMGroupListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_ncm_groups(request):
+@query_budget(3)
+def list_ncm_groups(request, page: PaginationQuerySchema = Query(...)):
     decode_jwt_token(request.headers.get("Authorization"))
-    return ncm_service.list_ncm_groups()
+    return ncm_service.list_ncm_groups(**page.dict())
 
 
 @ncm_router.get(
@@ -89,6 +114,7 @@ def list_ncm_groups(request):
         HTTPStatus.FORBIDDEN: ErrorSchema,
     },
 )
+@query_budget(2)
 def get_ncm_group(request, group_id: uuid.UUID):
     decode_jwt_token(request.headers.get("Authorization"))
     return ncm_service.get_ncm_group(group_id)
@@ -137,12 +163,54 @@ def create_ncm(request, payload: NCMSCreateSchema):
     return ncm_service.create_ncm(jwt, payload)
 
 
+@ncm_router.post(
+    "/bulk",
+    response={
+        HTTPStatus.OK: NCMBulkResultSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def bulk_create_ncms(request, payload: NCMBulkCreateSchema):
+    jwt = decode_jwt_token(request.headers.get("Authorization"))
+    return ncm_service.bulk_create_ncms(jwt, payload)
+
+
+@ncm_router.post(
+    "/bulk/csv",
+    response={
+        HTTPStatus.OK: NCMBulkResultSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def import_ncms_csv(
+    request,
+    file: UploadedFile = File(...),
+    group: Optional[uuid.UUID] = Form(None),
+):
+    jwt = decode_jwt_token(request.headers.get("Authorization"))
+    return ncm_service.import_ncms_csv(jwt, file, group)
+
+
 @ncm_router.get(
-    "", response={HTTPStatus.OK: NCMSListchema, HTTPStatus.FORBIDDEN: ErrorSchema}
+    "",
+    response={
+        HTTPStatus.OK: NCMSListchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_ncms(request):
+@query_budget(2)
+def list_ncms(
+    request,
+    group_id: Optional[uuid.UUID] = None,
+    code_prefix: Optional[str] = None,
+    page: PaginationQuerySchema = Query(...),
+):
     decode_jwt_token(request.headers.get("Authorization"))
-    return ncm_service.list_ncms()
+    return ncm_service.list_ncms(group_id, code_prefix, **page.dict())
 
 
 @ncm_router.get(
@@ -153,6 +221,7 @@ def list_ncms(request):
         HTTPStatus.FORBIDDEN: ErrorSchema,
     },
 )
+@query_budget(1)
 def get_ncm(request, ncm_id: uuid.UUID):
     decode_jwt_token(request.headers.get("Authorization"))
     return ncm_service.get_ncm(ncm_id)
@@ -193,6 +262,7 @@ def delete_ncm(request, ncm_id: uuid.UUID):
         HTTPStatus.OK: ICMSRateSchema,
         HTTPStatus.FORBIDDEN: ErrorSchema,
         HTTPStatus.BAD_REQUEST: ErrorSchema,
+        HTTPStatus.CONFLICT: ErrorSchema,
         HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
     },
 )
@@ -203,20 +273,58 @@ def create_icms_rate(request, payload: ICMSRateCreateSchema):
 
 @icms_router.get(
     "/rates",
-    response={HTTPStatus.OK: ICMSRateListSchema, HTTPStatus.FORBIDDEN: ErrorSchema},
+    response={
+        HTTPStatus.OK: ICMSRateListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_icms_rates(request):
+@query_budget(2)
+def list_icms_rates(
+    request,
+    min_total_rate: Optional[float] = None,
+    max_total_rate: Optional[float] = None,
+    ordering: Optional[str] = None,
+    as_of: Optional[date] = None,
+    state_id: Optional[uuid.UUID] = None,
+    group_id: Optional[uuid.UUID] = None,
+    page: PaginationQuerySchema = Query(...),
+):
     decode_jwt_token(request.headers.get("Authorization"))
-    return icms_service.list_icms_rates()
+    return icms_service.list_icms_rates(
+        min_total_rate,
+        max_total_rate,
+        ordering,
+        as_of,
+        state_id,
+        group_id,
+        **page.dict(),
+    )
+
+
+@icms_router.get(
+    "/rates/matrix",
+    response={HTTPStatus.OK: ICMSRateMatrixSchema, HTTPStatus.FORBIDDEN: ErrorSchema},
+)
+def get_icms_rate_matrix(request, as_of: Optional[date] = None):
+    decode_jwt_token(request.headers.get("Authorization"))
+    return icms_service.get_rate_matrix(as_of)
 
 
 @icms_router.get(
     "/rates/group/{group_id}",
-    response={HTTPStatus.OK: ICMSRateListSchema, HTTPStatus.FORBIDDEN: ErrorSchema},
+    response={
+        HTTPStatus.OK: ICMSRateListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_icms_rates_by_group(request, group_id: uuid.UUID):
+@query_budget(2)
+def list_icms_rates_by_group(
+    request, group_id: uuid.UUID, page: PaginationQuerySchema = Query(...)
+):
     decode_jwt_token(request.headers.get("Authorization"))
-    return icms_service.list_icms_rates_by_group(group_id)
+    return icms_service.list_icms_rates_by_group(group_id, **page.dict())
 
 
 @icms_router.post(
@@ -247,6 +355,52 @@ def bulk_update_icms_rates(request, payload: ICMSRateBulkUpdateSchema):
     return icms_service.bulk_update_icms_rates(jwt, payload)
 
 
+@icms_router.put(
+    "/rates/bulk-upsert",
+    response={
+        HTTPStatus.OK: ICMSRateBulkUpsertResultSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+        HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
+    },
+)
+def bulk_upsert_icms_rates(request, payload: ICMSRateBulkCreateSchema):
+    jwt = decode_jwt_token(request.headers.get("Authorization"))
+    return icms_service.bulk_upsert_icms_rates(jwt, payload)
+
+
+@icms_router.post(
+    "/rates/import",
+    response={
+        HTTPStatus.OK: ICMSRateImportResultSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+        HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
+    },
+)
+def import_icms_rates(
+    request,
+    file: UploadedFile = File(...),
+    dry_run: bool = Form(False),
+    valid_from: Optional[date] = Form(None),
+):
+    jwt = decode_jwt_token(request.headers.get("Authorization"))
+    return icms_import_service.import_icms_rates(jwt, file, dry_run, valid_from)
+
+
+@icms_router.get(
+    "/reference-cache",
+    response={
+        HTTPStatus.OK: ReferenceCacheStatsSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+    },
+)
+def get_reference_cache_stats(request):
+    decode_jwt_token(request.headers.get("Authorization"))
+    return reference_cache.stats()
+
+
 @icms_router.get(
     "/rates/{icms_rate_id}",
     response={
@@ -255,6 +409,7 @@ def bulk_update_icms_rates(request, payload: ICMSRateBulkUpdateSchema):
         HTTPStatus.FORBIDDEN: ErrorSchema,
     },
 )
+@query_budget(1)
 def get_icms_rate(request, icms_rate_id: uuid.UUID):
     decode_jwt_token(request.headers.get("Authorization"))
     return icms_service.get_icms_rate(icms_rate_id)
@@ -267,6 +422,7 @@ def get_icms_rate(request, icms_rate_id: uuid.UUID):
         HTTPStatus.NOT_FOUND: ErrorSchema,
         HTTPStatus.FORBIDDEN: ErrorSchema,
         HTTPStatus.BAD_REQUEST: ErrorSchema,
+        HTTPStatus.CONFLICT: ErrorSchema,
         HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
     },
 )
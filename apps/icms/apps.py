@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ICMSConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.icms"
+
+    def ready(self):
+        from utils.reference_cache import connect_signals
+
+        connect_signals()
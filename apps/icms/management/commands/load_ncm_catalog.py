@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.icms.services.ncm_catalog_service import NCMCatalogService
+
+
+class Command(BaseCommand):
+    help = "Replace the local NCM catalog with the official nomenclature file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            type=Path,
+            help="Siscomex NCM JSON file or a 'code;description' CSV.",
+        )
+        parser.add_argument("--encoding", default="utf-8")
+        parser.add_argument(
+            "--from-brasilapi",
+            action="store_true",
+            help="Download the catalog from BrasilAPI instead of reading a file.",
+        )
+
+    def handle(self, *args, **options):
+        service = NCMCatalogService()
+
+        if options["from_brasilapi"]:
+            total = service.refresh_from_brasil_api()
+        elif options["path"]:
+            if not options["path"].exists():
+                raise CommandError(f"Arquivo {options['path']} não encontrado.")
+            total = service.load_file(options["path"], options["encoding"])
+        else:
+            raise CommandError("Informe o arquivo do catálogo ou --from-brasilapi.")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} NCMs carregados no catálogo."))
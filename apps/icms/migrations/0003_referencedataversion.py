@@ -0,0 +1,26 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icms", "0002_alter_ncm_code_icmsrate_unique_state_group_icmsrate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReferenceDataVersion",
+            fields=[
+                (
+                    "id",
+                    models.PositiveSmallIntegerField(
+                        default=1, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+def populate_total_rate(apps, schema_editor):
+    ICMSRate = apps.get_model("icms", "ICMSRate")
+    ICMSRate.objects.update(
+        total_rate=models.F("internal_rate")
+        + models.F("difal_rate")
+        + models.F("poverty_rate")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icms", "0003_referencedataversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="icmsrate",
+            name="total_rate",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=0, editable=False, max_digits=6
+            ),
+        ),
+        migrations.RunPython(populate_total_rate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:44
+
+import datetime
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Rates stored before versioning have always applied, so contracts of any
+# delivery date keep resolving to them.
+LEGACY_VALID_FROM = datetime.date(2000, 1, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icms", "0005_ncmcatalogentry"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="icmsrate",
+            name="unique_state_group_icmsrate",
+        ),
+        migrations.AddField(
+            model_name="icmsrate",
+            name="valid_from",
+            field=models.DateField(default=LEGACY_VALID_FROM),
+        ),
+        migrations.AlterField(
+            model_name="icmsrate",
+            name="valid_from",
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddField(
+            model_name="icmsrate",
+            name="valid_to",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="icmsrate",
+            constraint=models.UniqueConstraint(
+                fields=("state", "group", "valid_from"),
+                name="unique_state_group_valid_from_icmsrate",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="icmsrate",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    ("valid_to__isnull", True),
+                    ("valid_to__gt", models.F("valid_from")),
+                    _connector="OR",
+                ),
+                name="icmsrate_valid_to_after_valid_from",
+            ),
+        ),
+    ]
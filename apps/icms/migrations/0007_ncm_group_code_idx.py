@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icms", "0006_icmsrate_validity"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ncm",
+            index=models.Index(fields=["group", "code"], name="ncm_group_code_idx"),
+        ),
+    ]
@@ -1,4 +1,8 @@
+from datetime import date
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
 
 from utils.base_model import BaseModel
 
@@ -25,6 +29,10 @@ class NCM(BaseModel):
     def __str__(self):
         return str(self.code)
 
+    class Meta:
+        # Serves the group filter of the NCM list in its (code, id) key order.
+        indexes = [models.Index(fields=["group", "code"], name="ncm_group_code_idx")]
+
 
 class ICMSRate(BaseModel):
     state = models.ForeignKey(
@@ -36,17 +44,76 @@ class ICMSRate(BaseModel):
     internal_rate = models.DecimalField(max_digits=5, decimal_places=2)
     difal_rate = models.DecimalField(max_digits=5, decimal_places=2)
     poverty_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    total_rate = models.DecimalField(
+        max_digits=6, decimal_places=2, default=0, editable=False, db_index=True
+    )
+    valid_from = models.DateField(default=timezone.localdate)
+    valid_to = models.DateField(null=True, blank=True, editable=False)
 
     def __str__(self):
-        return f"{self.group} - {self.state} - {self.total_rate}%"
+        return f"{self.group} - {self.state} - {self.total_rate}% ({self.valid_from})"
+
+    def compute_total_rate(self) -> Decimal:
+        return sum(
+            (
+                Decimal(str(rate))
+                for rate in (self.internal_rate, self.difal_rate, self.poverty_rate)
+            ),
+            Decimal(0),
+        )
 
-    @property
-    def total_rate(self):
-        return self.internal_rate + self.difal_rate + self.poverty_rate
+    def save(self, *args, **kwargs):
+        self.total_rate = self.compute_total_rate()
+        if (update_fields := kwargs.get("update_fields")) is not None:
+            kwargs["update_fields"] = {*update_fields, "total_rate"}
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def effective_on(as_of: date) -> models.Q:
+        """Filter for the versions in force on ``as_of``; ``valid_to`` is exclusive."""
+        return models.Q(valid_from__lte=as_of) & (
+            models.Q(valid_to__isnull=True) | models.Q(valid_to__gt=as_of)
+        )
 
     class Meta:
+        # The unique index on (state, group, valid_from) also serves the as-of
+        # lookup: equality on the pair, then a backward range scan on valid_from.
         constraints = [
             models.UniqueConstraint(
-                fields=["state", "group"], name="unique_state_group_icmsrate"
-            )
+                fields=["state", "group", "valid_from"],
+                name="unique_state_group_valid_from_icmsrate",
+            ),
+            models.CheckConstraint(
+                check=models.Q(valid_to__isnull=True)
+                | models.Q(valid_to__gt=models.F("valid_from")),
+                name="icmsrate_valid_to_after_valid_from",
+            ),
         ]
+
+
+class ReferenceDataVersion(models.Model):
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(
+            version=models.F("version") + 1, updated_at=timezone.now()
+        ):
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+
+class NCMCatalogEntry(BaseModel):
+    code = models.CharField(max_length=10, unique=True)
+    description = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return str(self.code)
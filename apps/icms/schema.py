@@ -1,4 +1,5 @@
 import uuid
+from datetime import date
 from typing import Optional
 
 from ninja import Schema
@@ -11,7 +12,8 @@ class StateSchema(Schema):
 
 
 class StateListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     states: list[StateSchema]
 
 
@@ -25,6 +27,16 @@ class NCMSCreateSchema(Schema):
     group: uuid.UUID
 
 
+class NCMBulkItemSchema(Schema):
+    code: str
+    group: Optional[uuid.UUID] = None
+
+
+class NCMBulkCreateSchema(Schema):
+    group: Optional[uuid.UUID] = None
+    ncms: list[NCMBulkItemSchema]
+
+
 class NCMGroupCreateSchema(Schema):
     name: str
 
@@ -43,17 +55,31 @@ class NCMSchemaWithGroup(NCMSchema):
 
 
 class NCMSListchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     ncms: list[NCMSchemaWithGroup]
 
 
+class NCMBulkErrorSchema(Schema):
+    row: int
+    code: str
+    detail: str
+
+
+class NCMBulkResultSchema(Schema):
+    created: int
+    ncms: list[NCMSchemaWithGroup]
+    errors: list[NCMBulkErrorSchema]
+
+
 class NCMGroupSchema(NCMGroupCreateSchema):
     id: uuid.UUID
     ncms: list[NCMSchema]
 
 
 class NCMGroupListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     ncm_groups: list[NCMGroupSchema]
 
 
@@ -63,18 +89,53 @@ class ICMSRateCreateSchema(Schema):
     internal_rate: float
     difal_rate: float
     poverty_rate: float
+    valid_from: Optional[date] = None
 
 
 class ICMSRateBulkCreateSchema(Schema):
     rates: list[ICMSRateCreateSchema]
 
 
+class ICMSRateBulkUpsertResultSchema(Schema):
+    created: int
+    updated: int
+
+
+class ICMSRateImportChangeSchema(Schema):
+    state: str
+    group: str
+    action: str
+    internal_rate: float
+    difal_rate: float
+    poverty_rate: float
+    total_rate: float
+    previous_total_rate: Optional[float] = None
+
+
+class ICMSRateImportErrorSchema(Schema):
+    row: int
+    column: int
+    detail: str
+
+
+class ICMSRateImportResultSchema(Schema):
+    dry_run: bool
+    valid_from: date
+    applied: bool
+    created: int
+    updated: int
+    unchanged: int
+    changes: list[ICMSRateImportChangeSchema]
+    errors: list[ICMSRateImportErrorSchema]
+
+
 class ICMSRateUpdateSchema(Schema):
     state: Optional[uuid.UUID] = None
     group: Optional[uuid.UUID] = None
     internal_rate: Optional[float] = None
     difal_rate: Optional[float] = None
     poverty_rate: Optional[float] = None
+    valid_from: Optional[date] = None
 
 
 class ICMSRateBulkUpdateSchema(Schema):
@@ -89,15 +150,35 @@ class ICMSRateSchema(Schema):
     difal_rate: float
     poverty_rate: float
     total_rate: float
+    valid_from: date
+    valid_to: Optional[date] = None
 
 
 class ICMSRateListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     icms_rates: list[ICMSRateSchema]
 
 
+class ICMSRateMatrixSchema(Schema):
+    version: int
+    as_of: date
+    fields: list[str]
+    states: list[StateSchema]
+    groups: list[NCMGroupRateSchema]
+    rates: dict[str, dict[str, list[float]]]
+
+
+class ReferenceCacheStatsSchema(Schema):
+    version: Optional[int] = None
+    loaded_at: Optional[float] = None
+    hits: int
+    misses: int
+
+
 class ICMSRateContractSchema(Schema):
     total_rate: float
+    valid_from: date
 
 
 class StateContractSchema(Schema):
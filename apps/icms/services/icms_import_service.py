@@ -0,0 +1,227 @@
+import csv
+import io
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from http import HTTPStatus
+from typing import Optional
+
+from django.utils import timezone
+from ninja.errors import HttpError
+from ninja.files import UploadedFile
+
+from apps.icms.models import ICMSRate, NCMGroup, State
+from apps.icms.schema import ICMSRateCreateSchema
+from apps.icms.services.icms_service import ICMSService
+from utils.spreadsheet import sniff_csv
+from utils.validation import ValidationService
+
+
+class ICMSImportService:
+    """Import a full state x NCM group ICMS table from one spreadsheet export.
+
+    The grid has two header rows: the first names each group once above its
+    column block and the second names the rate of each column in the block::
+
+        UF;Grupo 1;;;Grupo 2;;
+        ;interno;difal;pobreza;interno;difal;pobreza
+        AC;19;0;0;17;2;0
+    """
+
+    RATE_COLUMNS = {
+        "interno": "internal_rate",
+        "internal": "internal_rate",
+        "difal": "difal_rate",
+        "pobreza": "poverty_rate",
+        "fcp": "poverty_rate",
+        "poverty": "poverty_rate",
+    }
+    RATE_FIELDS = ("internal_rate", "difal_rate", "poverty_rate")
+    MAX_RATE = Decimal(100)
+
+    def __init__(self):
+        self.icms_service = ICMSService()
+        self.validation_service = ValidationService()
+
+    def import_icms_rates(
+        self,
+        jwt: dict,
+        file: UploadedFile,
+        dry_run: bool = False,
+        valid_from: Optional[date] = None,
+    ):
+        """Diff the grid against the rates in force on ``valid_from`` (today by
+        default) and, unless ``dry_run``, store the changes as versions starting
+        on that date."""
+        if not self.validation_service.validate_user_access(jwt):
+            raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
+
+        try:
+            content = file.read().decode("utf-8-sig")
+        except UnicodeDecodeError as exc:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Arquivo CSV inválido.") from exc
+
+        rows = list(csv.reader(io.StringIO(content), sniff_csv(content)))
+        if len(rows) < 3:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Planilha de ICMS vazia.")
+
+        columns = self._parse_header(rows[0], rows[1])
+        rates, errors = self._parse_rows(rows[2:], columns)
+        valid_from = valid_from or timezone.localdate()
+        changes = self._diff(rates, valid_from)
+
+        applied = not dry_run and not errors and bool(changes)
+        if applied:
+            self.icms_service.upsert_icms_rates(
+                [
+                    ICMSRateCreateSchema(
+                        state=change["state_id"],
+                        group=change["group_id"],
+                        valid_from=valid_from,
+                        **{field: change[field] for field in self.RATE_FIELDS},
+                    )
+                    for change in changes
+                ]
+            )
+
+        return {
+            "dry_run": dry_run,
+            "valid_from": valid_from,
+            "applied": applied,
+            "created": sum(change["action"] == "create" for change in changes),
+            "updated": sum(change["action"] == "update" for change in changes),
+            "unchanged": len(rates) - len(changes),
+            "changes": changes,
+            "errors": errors,
+        }
+
+    def _parse_header(self, group_row, field_row):
+        """Map each rate column index to its (group, rate field)."""
+        group_names = set()
+        column_names = {}
+        group_name = None
+
+        for index in range(1, max(len(group_row), len(field_row))):
+            if index < len(group_row) and group_row[index].strip():
+                group_name = group_row[index].strip()
+                group_names.add(group_name)
+
+            label = field_row[index].strip().lower() if index < len(field_row) else ""
+            if not label:
+                continue
+
+            if group_name is None or label not in self.RATE_COLUMNS:
+                raise HttpError(
+                    HTTPStatus.BAD_REQUEST,
+                    f"Cabeçalho inválido na coluna {index + 1}: '{label}'.",
+                )
+            column_names[index] = (group_name, self.RATE_COLUMNS[label])
+
+        groups = {
+            group.name: group for group in NCMGroup.objects.filter(name__in=group_names)
+        }
+        if missing_groups := group_names - groups.keys():
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"Grupos de NCM não encontrados: {', '.join(sorted(missing_groups))}",
+            )
+
+        for group_name in group_names:
+            fields = {
+                field for name, field in column_names.values() if name == group_name
+            }
+            if fields != set(self.RATE_FIELDS):
+                raise HttpError(
+                    HTTPStatus.BAD_REQUEST,
+                    f"O grupo {group_name} deve ter as colunas interno, difal e pobreza.",
+                )
+
+        return {
+            index: (groups[group_name], field)
+            for index, (group_name, field) in column_names.items()
+        }
+
+    def _parse_rows(self, rows, columns):
+        states = {state.code: state for state in State.objects.all()}
+        rates = {}
+        errors = []
+        seen_states = set()
+
+        for row_number, row in enumerate(rows, start=3):
+            if not any(cell.strip() for cell in row):
+                continue
+
+            state_code = row[0].strip().upper()
+            if not (state := states.get(state_code)) or state_code in seen_states:
+                detail = (
+                    f"Estado '{state_code}' duplicado."
+                    if state
+                    else f"Estado '{state_code}' não encontrado."
+                )
+                errors.append({"row": row_number, "column": 1, "detail": detail})
+                continue
+
+            seen_states.add(state_code)
+
+            for index, (group, field) in columns.items():
+                cell = row[index].strip() if index < len(row) else ""
+                try:
+                    value = Decimal(cell.replace(",", "."))
+                except InvalidOperation:
+                    value = None
+
+                # NaN can't be compared, so it has to be rejected before the range check.
+                if (
+                    value is None
+                    or not value.is_finite()
+                    or not Decimal(0) <= value < self.MAX_RATE
+                ):
+                    errors.append(
+                        {
+                            "row": row_number,
+                            "column": index + 1,
+                            "detail": f"Taxa inválida: '{cell}'.",
+                        }
+                    )
+                    continue
+
+                rates.setdefault((state, group), {})[field] = value.quantize(
+                    Decimal("0.01")
+                )
+
+        return rates, errors
+
+    def _diff(self, rates, valid_from: date):
+        existing = {
+            (rate.state_id, rate.group_id): rate
+            for rate in ICMSRate.objects.filter(
+                ICMSRate.effective_on(valid_from),
+                state__in={state for state, _ in rates},
+                group__in={group for _, group in rates},
+            )
+        }
+
+        changes = []
+        for (state, group), values in rates.items():
+            if len(values) != len(self.RATE_FIELDS):
+                continue
+
+            current = existing.get((state.id, group.id))
+            if current and all(
+                getattr(current, field) == values[field] for field in self.RATE_FIELDS
+            ):
+                continue
+
+            changes.append(
+                {
+                    "state": state.code,
+                    "state_id": state.id,
+                    "group": group.name,
+                    "group_id": group.id,
+                    "action": "update" if current else "create",
+                    **values,
+                    "total_rate": sum(values.values()),
+                    "previous_total_rate": current.total_rate if current else None,
+                }
+            )
+
+        return changes
@@ -1,10 +1,14 @@
 import uuid
+from datetime import date
 from http import HTTPStatus
+from typing import Optional
 
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse
+from django.utils import timezone
 from ninja.errors import HttpError
 
-from apps.icms.models import ICMSRate
+from apps.icms.models import ICMSRate, NCMGroup, State
 from apps.icms.schema import (
     ICMSRateBulkCreateSchema,
     ICMSRateBulkUpdateSchema,
@@ -13,10 +17,21 @@ from apps.icms.schema import (
 )
 from apps.icms.services.ncm_service import NCMService
 from apps.icms.services.state_service import StateService
+from utils.pagination import DEFAULT_LIMIT, paginate
+from utils.reference_cache import reference_cache
 from utils.validation import ValidationService
 
 
 class ICMSService:
+    ORDERING_FIELDS = {
+        "total_rate": ("total_rate", "id"),
+        "-total_rate": ("-total_rate", "id"),
+        "state": ("state__code", "group__name", "valid_from", "id"),
+        "-state": ("-state__code", "group__name", "valid_from", "id"),
+        "group": ("group__name", "state__code", "valid_from", "id"),
+        "-group": ("-group__name", "state__code", "valid_from", "id"),
+    }
+
     def __init__(self):
         self.ncm_service = NCMService()
         self.state_service = StateService()
@@ -29,76 +44,36 @@ class ICMSService:
         state = self.state_service.get_state(payload.state)
         ncm_group = self.ncm_service.get_ncm_group(payload.group)
 
-        return ICMSRate.objects.create(
+        icms_rate = ICMSRate(
             state=state,
             group=ncm_group,
             internal_rate=payload.internal_rate,
             difal_rate=payload.difal_rate,
             poverty_rate=payload.poverty_rate,
+            valid_from=payload.valid_from or timezone.localdate(),
         )
+        self._save_version(icms_rate, {(state.id, ncm_group.id)})
+        return icms_rate
 
     def bulk_create_icms_rates(self, jwt: dict, payload: ICMSRateBulkCreateSchema):
         if not self.validation_service.validate_user_access(jwt):
             raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
 
-        if not (rates := payload.rates):
-            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum dado enviado.")
-
-        group_id = rates[0].group
-        ncm_group = self.ncm_service.get_ncm_group(group_id)
+        rates = self._validate_single_group_rates(payload.rates)
 
-        for rate in rates:
-            if rate.group != group_id:
-                raise HttpError(
-                    HTTPStatus.BAD_REQUEST,
-                    "Todos os registros devem usar o mesmo grupo de NCM.",
-                )
-            if (
-                rate.internal_rate is None
-                or rate.difal_rate is None
-                or rate.poverty_rate is None
-            ):
-                raise HttpError(HTTPStatus.BAD_REQUEST, "As taxas não podem ser nulas.")
-
-        all_states_data = self.state_service.list_states()
-        all_states = all_states_data["states"]
-        all_state_codes = {state.code for state in all_states}
-
-        rates_state_codes = {
-            next(
-                (state.code for state in all_states if state.id == item.state),
-                None,
-            )
-            for item in rates
-        }
-
-        if missing_states := all_state_codes - rates_state_codes:
+        if missing_states := State.objects.exclude(
+            id__in={rate.state for rate in rates}
+        ).values_list("code", flat=True):
             raise HttpError(
                 HTTPStatus.BAD_REQUEST,
                 f"Os seguintes estados não foram enviados: {', '.join(missing_states)}",
             )
 
-        rates_to_create = []
-        for rate in rates:
-            if not (state := next((s for s in all_states if s.id == rate.state), None)):
-                raise HttpError(
-                    HTTPStatus.NOT_FOUND,
-                    f"Estado com ID {rate.state} não encontrado.",
-                )
-            rates_to_create.append(
-                ICMSRate(
-                    state=state,
-                    group=ncm_group,
-                    internal_rate=rate.internal_rate,
-                    difal_rate=rate.difal_rate,
-                    poverty_rate=rate.poverty_rate,
-                )
-            )
-
-        ICMSRate.objects.bulk_create(rates_to_create)
+        result = self.upsert_icms_rates(rates, mode="create")
+        created = result["created"] + result["updated"]
 
         return JsonResponse(
-            {"detail": f"{len(rates_to_create)} registros criados com sucesso"},
+            {"detail": f"{created} registros criados com sucesso"},
             status=HTTPStatus.OK,
         )
 
@@ -106,79 +81,243 @@ class ICMSService:
         if not self.validation_service.validate_user_access(jwt):
             raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
 
-        if not (rates := payload.rates):
+        rates = self._validate_single_group_rates(payload.rates)
+        result = self.upsert_icms_rates(rates, mode="update")
+
+        return JsonResponse(
+            {"detail": f"{result['updated']} registros atualizados com sucesso"},
+            status=HTTPStatus.OK,
+        )
+
+    def bulk_upsert_icms_rates(self, jwt: dict, payload: ICMSRateBulkCreateSchema):
+        if not self.validation_service.validate_user_access(jwt):
+            raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
+
+        if not payload.rates:
             raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum dado enviado.")
 
-        group_id = rates[0].group
-        ncm_group = self.ncm_service.get_ncm_group(group_id)
+        return self.upsert_icms_rates(payload.rates)
+
+    @staticmethod
+    def _validate_single_group_rates(rates):
+        if not rates:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum dado enviado.")
 
+        group_id = rates[0].group
         for rate in rates:
             if rate.group != group_id:
                 raise HttpError(
                     HTTPStatus.BAD_REQUEST,
                     "Todos os registros devem usar o mesmo grupo de NCM.",
                 )
+
+        return rates
+
+    def upsert_icms_rates(self, rates, mode: str = "upsert"):
+        """Write many rate versions with one INSERT ... ON CONFLICT DO UPDATE.
+
+        A rate without ``valid_from`` becomes the version starting today, so
+        earlier versions (and the contracts priced with them) stay untouched.
+        ``mode`` keeps the stricter contracts of the legacy endpoints: "create"
+        rejects versions that already exist and "update" rejects pairs that
+        have no rate yet. A rate counts as updated when its pair already had a
+        version, whether it overwrote that day's version or superseded one.
+        """
+        today = timezone.localdate()
+        for rate in rates:
             if (
-                rate.internal_rate is None
+                rate.state is None
+                or rate.group is None
+                or rate.internal_rate is None
                 or rate.difal_rate is None
                 or rate.poverty_rate is None
             ):
                 raise HttpError(HTTPStatus.BAD_REQUEST, "As taxas não podem ser nulas.")
 
-        all_states_data = self.state_service.list_states()
-        all_states = all_states_data["states"]
+        states = State.objects.in_bulk({rate.state for rate in rates})
+        groups = NCMGroup.objects.in_bulk({rate.group for rate in rates})
 
-        rates_to_update = []
         for rate in rates:
-            if not (state := next((s for s in all_states if s.id == rate.state), None)):
+            if rate.state not in states:
                 raise HttpError(
                     HTTPStatus.NOT_FOUND,
                     f"Estado com ID {rate.state} não encontrado.",
                 )
-            icms_rate = ICMSRate.objects.filter(state=state, group=ncm_group).first()
-            if icms_rate:
-                icms_rate.state = state
-                icms_rate.group = ncm_group
-                icms_rate.internal_rate = rate.internal_rate
-                icms_rate.difal_rate = rate.difal_rate
-                icms_rate.poverty_rate = rate.poverty_rate
-                rates_to_update.append(icms_rate)
-            else:
+            if rate.group not in groups:
+                raise HttpError(HTTPStatus.NOT_FOUND, "Grupo de NCM não encontrado")
+
+        existing_keys = set(
+            ICMSRate.objects.filter(
+                state_id__in=states.keys(), group_id__in=groups.keys()
+            ).values_list("state_id", "group_id", "valid_from")
+        )
+        existing_pairs = {
+            (state_id, group_id) for state_id, group_id, _ in existing_keys
+        }
+
+        rates_by_key = {}
+        for rate in rates:
+            key = (rate.state, rate.group, rate.valid_from or today)
+            state, ncm_group = states[rate.state], groups[rate.group]
+
+            if mode == "create" and key in existing_keys:
+                raise HttpError(
+                    HTTPStatus.BAD_REQUEST,
+                    f"Taxa de ICMS para o estado {state.code} e grupo {ncm_group.name} já existe.",
+                )
+            if mode == "update" and key[:2] not in existing_pairs:
                 raise HttpError(
                     HTTPStatus.NOT_FOUND,
                     f"Taxa de ICMS para o estado {state.code} e grupo {ncm_group.name} não encontrada.",
                 )
 
-        ICMSRate.objects.bulk_update(
-            rates_to_update,
-            ["state", "group", "internal_rate", "difal_rate", "poverty_rate"],
-        )
+            icms_rate = ICMSRate(
+                state=state,
+                group=ncm_group,
+                internal_rate=rate.internal_rate,
+                difal_rate=rate.difal_rate,
+                poverty_rate=rate.poverty_rate,
+                valid_from=key[2],
+            )
+            icms_rate.total_rate = icms_rate.compute_total_rate()
+            rates_by_key[key] = icms_rate
+
+        with transaction.atomic():
+            ICMSRate.objects.bulk_create(
+                rates_by_key.values(),
+                update_conflicts=True,
+                unique_fields=["state", "group", "valid_from"],
+                update_fields=[
+                    "internal_rate",
+                    "difal_rate",
+                    "poverty_rate",
+                    "total_rate",
+                    "updated_at",
+                ],
+            )
+            self.sync_valid_to({key[:2] for key in rates_by_key})
+            reference_cache.bump_version()
 
-        return JsonResponse(
-            {"detail": f"{len(rates_to_update)} registros atualizados com sucesso"},
-            status=HTTPStatus.OK,
-        )
+        updated = sum(1 for key in rates_by_key if key[:2] in existing_pairs)
+        return {"created": len(rates_by_key) - updated, "updated": updated}
+
+    @staticmethod
+    def sync_valid_to(pairs: set[tuple[uuid.UUID, uuid.UUID]]):
+        """Close each version of the given (state, group) pairs where the next starts."""
+        if not pairs:
+            return
+
+        versions = ICMSRate.objects.filter(
+            state_id__in={state_id for state_id, _ in pairs},
+            group_id__in={group_id for _, group_id in pairs},
+        ).order_by("state_id", "group_id", "valid_from")
+
+        versions_by_pair = {}
+        for rate in versions:
+            if (pair := (rate.state_id, rate.group_id)) in pairs:
+                versions_by_pair.setdefault(pair, []).append(rate)
+
+        changed = []
+        for versions in versions_by_pair.values():
+            for rate, next_rate in zip(versions, [*versions[1:], None]):
+                valid_to = next_rate.valid_from if next_rate else None
+                if rate.valid_to != valid_to:
+                    rate.valid_to = valid_to
+                    changed.append(rate)
+
+        ICMSRate.objects.bulk_update(changed, ["valid_to"])
 
     @staticmethod
     def get_icms_rate_by_id(icms_rate_id: uuid.UUID):
-        return ICMSRate.objects.filter(pk=icms_rate_id).first()
+        return (
+            ICMSRate.objects.select_related("state", "group")
+            .filter(pk=icms_rate_id)
+            .first()
+        )
 
-    def get_rate_by_state_and_ncm(self, state_code: str, ncm_code: str):
+    def get_rate_by_state_and_ncm(
+        self, state_code: str, ncm_code: str, as_of: Optional[date] = None
+    ):
         if not (state := self.state_service.get_state_by_code(state_code)):
             raise HttpError(HTTPStatus.NOT_FOUND, "Estado não encontrado")
 
         if not (ncm := self.ncm_service.get_ncm_by_code(ncm_code)):
             raise HttpError(HTTPStatus.NOT_FOUND, "NCM não encontrado")
 
-        group = ncm.group
+        if not (entry := reference_cache.get_rate_entry(state.code, ncm.code, as_of)):
+            return None
 
-        return ICMSRate.objects.filter(state=state, group=group).first()
+        return entry.rate
 
     @staticmethod
-    def list_icms_rates():
+    def get_rate_matrix(as_of: Optional[date] = None):
+        as_of = as_of or timezone.localdate()
+        snapshot = reference_cache.snapshot()
+        groups = sorted(snapshot.groups_by_id.values(), key=lambda group: group.name)
+        states = sorted(snapshot.states_by_code.values(), key=lambda state: state.code)
+
+        rates = {}
+        for state_code, versions_by_group in snapshot.rate_matrix.items():
+            for group_id, versions in versions_by_group.items():
+                if entry := reference_cache.find_version(versions, as_of):
+                    rates.setdefault(state_code, {})[str(group_id)] = [
+                        entry.internal_rate,
+                        entry.difal_rate,
+                        entry.poverty_rate,
+                        entry.total_rate,
+                    ]
+
+        return {
+            "version": snapshot.version,
+            "as_of": as_of,
+            "fields": ["internal_rate", "difal_rate", "poverty_rate", "total_rate"],
+            "states": states,
+            "groups": groups,
+            "rates": rates,
+        }
+
+    def list_icms_rates(
+        self,
+        min_total_rate: Optional[float] = None,
+        max_total_rate: Optional[float] = None,
+        ordering: Optional[str] = None,
+        as_of: Optional[date] = None,
+        state_id: Optional[uuid.UUID] = None,
+        group_id: Optional[uuid.UUID] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
         icms_rates = ICMSRate.objects.select_related("state", "group").all()
-        count = icms_rates.count()
-        return {"count": count, "icms_rates": icms_rates}
+
+        if state_id is not None:
+            icms_rates = icms_rates.filter(state_id=state_id)
+
+        if group_id is not None:
+            icms_rates = icms_rates.filter(group_id=group_id)
+
+        if as_of is not None:
+            icms_rates = icms_rates.filter(ICMSRate.effective_on(as_of))
+
+        if min_total_rate is not None:
+            icms_rates = icms_rates.filter(total_rate__gte=min_total_rate)
+
+        if max_total_rate is not None:
+            icms_rates = icms_rates.filter(total_rate__lte=max_total_rate)
+
+        if ordering is not None and ordering not in self.ORDERING_FIELDS:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"Ordenação inválida. Use um dos valores: {', '.join(self.ORDERING_FIELDS)}",
+            )
+
+        return paginate(
+            icms_rates,
+            self.ORDERING_FIELDS[ordering or "state"],
+            cursor,
+            limit,
+            with_count,
+        ).as_dict("icms_rates")
 
     def get_icms_rate(self, icms_rate_id: uuid.UUID):
         if not (icms_rate := self.get_icms_rate_by_id(icms_rate_id)):
@@ -189,18 +328,38 @@ class ICMSService:
     def update_icms_rate(
         self, jwt: dict, icms_rate_id: uuid.UUID, payload: ICMSRateUpdateSchema
     ):
+        """Store the edited rate as a new version starting on ``valid_from``.
+
+        The edited version is closed where the new one starts, so contracts
+        priced with it can still be reproduced. Only a version that already
+        starts on that day, such as one created today, is changed in place.
+        The (state, group) pair identifies the versions, so it can't change.
+        """
         if not self.validation_service.validate_user_access(jwt):
             raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
 
-        icms_rate = self.get_icms_rate(icms_rate_id)
-
-        if payload.state is not None:
-            state = self.state_service.get_state(payload.state)
-            icms_rate.state = state
+        current = self.get_icms_rate(icms_rate_id)
+        changes_pair = payload.state not in (None, current.state_id)
+        changes_pair |= payload.group not in (None, current.group_id)
+        if changes_pair:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                "O estado e o grupo de uma taxa de ICMS não podem ser alterados. "
+                "Cadastre uma nova taxa para o outro estado ou grupo.",
+            )
 
-        if payload.group is not None:
-            ncm_group = self.ncm_service.get_ncm_group(payload.group)
-            icms_rate.group = ncm_group
+        valid_from = payload.valid_from or timezone.localdate()
+        if valid_from == current.valid_from:
+            icms_rate = current
+        else:
+            icms_rate = ICMSRate(
+                state=current.state,
+                group=current.group,
+                internal_rate=current.internal_rate,
+                difal_rate=current.difal_rate,
+                poverty_rate=current.poverty_rate,
+                valid_from=valid_from,
+            )
 
         if payload.internal_rate is not None:
             icms_rate.internal_rate = payload.internal_rate
@@ -211,16 +370,32 @@ class ICMSService:
         if payload.poverty_rate is not None:
             icms_rate.poverty_rate = payload.poverty_rate
 
-        icms_rate.save()
-
+        self._save_version(icms_rate, {(current.state_id, current.group_id)})
         return icms_rate
 
+    def _save_version(self, icms_rate: ICMSRate, pairs: set):
+        try:
+            with transaction.atomic():
+                icms_rate.save()
+                self.sync_valid_to(pairs)
+        except IntegrityError as exc:
+            raise HttpError(
+                HTTPStatus.CONFLICT,
+                f"Já existe uma taxa de ICMS para o estado {icms_rate.state.code} e "
+                f"grupo {icms_rate.group.name} a partir de "
+                f"{icms_rate.valid_from:%d/%m/%Y}.",
+            ) from exc
+
+        icms_rate.refresh_from_db(fields=["valid_to"])
+
     def delete_icms_rate(self, jwt: dict, icms_rate_id: uuid.UUID):
         if not self.validation_service.validate_user_access(jwt):
             raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
 
         icms_rate = self.get_icms_rate(icms_rate_id)
-        icms_rate.delete()
+        with transaction.atomic():
+            icms_rate.delete()
+            self.sync_valid_to({(icms_rate.state_id, icms_rate.group_id)})
 
         return JsonResponse(
             {"detail": "Taxa de ICMS deletada com sucesso"}, status=HTTPStatus.OK
@@ -230,7 +405,13 @@ class ICMSService:
     def filter_icms_rate_by_group_id(group_id: uuid.UUID):
         return ICMSRate.objects.filter(group_id=group_id)
 
-    def list_icms_rates_by_group(self, group_id: uuid.UUID):
-        rates = self.filter_icms_rate_by_group_id(group_id)
-        count = rates.count()
-        return {"count": count, "icms_rates": rates}
+    def list_icms_rates_by_group(
+        self,
+        group_id: uuid.UUID,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        return self.list_icms_rates(
+            group_id=group_id, cursor=cursor, limit=limit, with_count=with_count
+        )
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from pathlib import Path
+
+from django.db import transaction
+
+from apps.icms.models import NCMCatalogEntry
+from utils.brasil_api_service import BrasilAPIService
+from utils.spreadsheet import sniff_csv
+from utils.validation import ValidationService
+
+
+class NCMCatalogService:
+    BATCH_SIZE = 2000
+
+    def __init__(self):
+        self.validation_service = ValidationService()
+        self.brasil_api_service = BrasilAPIService()
+
+    @staticmethod
+    def parse_file(path: Path, encoding: str = "utf-8"):
+        """Read the Siscomex NCM nomenclature (JSON) or a `code;description` CSV."""
+        with open(path, encoding=encoding) as file:
+            if path.suffix.lower() == ".json":
+                data = json.load(file)
+                rows = data.get("Nomenclaturas", []) if isinstance(data, dict) else data
+                return [
+                    (row.get("Codigo") or row.get("codigo"), row.get("Descricao") or "")
+                    for row in rows
+                ]
+
+            content = file.read()
+            return [
+                tuple(row[:2])
+                for row in csv.reader(io.StringIO(content), sniff_csv(content))
+                if len(row) >= 2
+            ]
+
+    def load_entries(self, entries) -> int:
+        catalog = {
+            code.strip(): description.strip()
+            for code, description in entries
+            if code and self.validation_service.validate_ncm_code_format(code.strip())
+        }
+
+        with transaction.atomic():
+            NCMCatalogEntry.objects.all().delete()
+            NCMCatalogEntry.objects.bulk_create(
+                [
+                    NCMCatalogEntry(code=code, description=description)
+                    for code, description in catalog.items()
+                ],
+                batch_size=self.BATCH_SIZE,
+            )
+
+        return len(catalog)
+
+    def load_file(self, path: Path, encoding: str = "utf-8") -> int:
+        return self.load_entries(self.parse_file(path, encoding))
+
+    def refresh_from_brasil_api(self) -> int:
+        return self.load_entries(
+            (ncm.get("codigo"), ncm.get("descricao") or "")
+            for ncm in self.brasil_api_service.list_ncms()
+        )
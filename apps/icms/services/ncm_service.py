@@ -1,16 +1,30 @@
+import csv
+import io
 import uuid
 from http import HTTPStatus
+from typing import Optional
 
 from django.db import IntegrityError
 from django.http import JsonResponse
 from ninja.errors import HttpError
+from ninja.files import UploadedFile
 
 from apps.icms.models import NCM, NCMGroup
-from apps.icms.schema import NCMGroupCreateSchema, NCMSCreateSchema, NCMSUpdateSchema
+from apps.icms.schema import (
+    NCMBulkCreateSchema,
+    NCMGroupCreateSchema,
+    NCMSCreateSchema,
+    NCMSUpdateSchema,
+)
+from utils.pagination import DEFAULT_LIMIT, paginate
+from utils.reference_cache import reference_cache
+from utils.spreadsheet import sniff_csv
 from utils.validation import ValidationService
 
 
 class NCMService:
+    MAX_BULK_ENTRIES = 1000
+
     def __init__(self):
         self.validation_service = ValidationService()
 
@@ -33,10 +47,18 @@ class NCMService:
         return NCMGroup.objects.count()
 
     @staticmethod
-    def list_ncm_groups():
-        ncm_groups = NCMGroup.objects.prefetch_related("ncms").all()
-        count = ncm_groups.count()
-        return {"count": count, "ncm_groups": ncm_groups}
+    def list_ncm_groups(
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        return paginate(
+            NCMGroup.objects.prefetch_related("ncms"),
+            ("name", "id"),
+            cursor,
+            limit,
+            with_count,
+        ).as_dict("ncm_groups")
 
     def get_ncm_group(self, group_id: uuid.UUID):
         if not (ncm_group := self.get_ncm_group_by_id(group_id)):
@@ -120,23 +142,159 @@ class NCMService:
                 HTTPStatus.INTERNAL_SERVER_ERROR, "Erro ao criar NCM"
             ) from exc
 
+    def bulk_create_ncms(self, jwt: dict, payload: NCMBulkCreateSchema):
+        if not self.validation_service.validate_user_access(jwt):
+            raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
+
+        entries = [
+            (row, item.code.strip(), item.group or payload.group)
+            for row, item in enumerate(payload.ncms, start=1)
+        ]
+        groups = NCMGroup.objects.in_bulk(
+            {group_id for _, _, group_id in entries if group_id}
+        )
+
+        return self._bulk_insert_ncms(
+            [
+                (row, code, group_id, groups.get(group_id))
+                for row, code, group_id in entries
+            ]
+        )
+
+    def import_ncms_csv(
+        self, jwt: dict, file: UploadedFile, group_id: Optional[uuid.UUID] = None
+    ):
+        if not self.validation_service.validate_user_access(jwt):
+            raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
+
+        default_group = self.get_ncm_group(group_id) if group_id else None
+
+        try:
+            content = file.read().decode("utf-8-sig")
+        except UnicodeDecodeError as exc:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Arquivo CSV inválido.") from exc
+
+        # Rows keep their spreadsheet number so errors point at the right line.
+        rows = [
+            (number, row)
+            for number, row in enumerate(
+                csv.reader(io.StringIO(content), sniff_csv(content)), start=1
+            )
+            if row
+        ]
+        if rows and not rows[0][1][0].strip()[:1].isdigit():
+            rows = rows[1:]
+
+        entries = [
+            (number, row[0].strip(), row[1].strip() if len(row) > 1 else "")
+            for number, row in rows
+        ]
+        groups = {
+            group.name: group
+            for group in NCMGroup.objects.filter(
+                name__in={name for _, _, name in entries if name}
+            )
+        }
+
+        return self._bulk_insert_ncms(
+            [
+                # The default group only fills empty cells; an unknown name is an error.
+                (
+                    row,
+                    code,
+                    name or default_group,
+                    groups.get(name) if name else default_group,
+                )
+                for row, code, name in entries
+            ]
+        )
+
+    def _bulk_insert_ncms(self, entries):
+        """Validate every row against set-based lookups and insert the valid ones.
+
+        ``entries`` holds ``(row, code, requested_group, resolved_group)`` tuples,
+        so errors can point back to the row that caused them.
+        """
+        if not entries:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum dado enviado.")
+
+        if len(entries) > self.MAX_BULK_ENTRIES:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"O limite de {self.MAX_BULK_ENTRIES} NCMs por importação foi atingido.",
+            )
+
+        well_formed_codes = {
+            code
+            for _, code, _, _ in entries
+            if self.validation_service.validate_ncm_code_format(code)
+        }
+        valid_codes = self.validation_service.validate_ncm_codes(well_formed_codes)
+        existing_codes = set(
+            NCM.objects.filter(code__in=well_formed_codes).values_list(
+                "code", flat=True
+            )
+        )
+
+        ncms_to_create = []
+        errors = []
+        for row, code, requested_group, group in entries:
+            if code not in well_formed_codes:
+                detail = "Código NCM no formato inválido"
+            elif code in existing_codes:
+                detail = "NCM com o código especificado já existe"
+            elif code not in valid_codes:
+                detail = "Código NCM inválido"
+            elif not requested_group:
+                detail = "Grupo de NCM não informado"
+            elif group is None:
+                detail = "Grupo de NCM não encontrado"
+            else:
+                existing_codes.add(code)
+                ncms_to_create.append(NCM(code=code, group=group))
+                continue
+
+            errors.append({"row": row, "code": code, "detail": detail})
+
+        if ncms_to_create:
+            NCM.objects.bulk_create(ncms_to_create)
+            reference_cache.bump_version()
+
+        return {
+            "created": len(ncms_to_create),
+            "ncms": ncms_to_create,
+            "errors": errors,
+        }
+
     @staticmethod
     def get_ncm_by_id(ncm_id: uuid.UUID):
-        return NCM.objects.filter(pk=ncm_id).first()
+        return NCM.objects.select_related("group").filter(pk=ncm_id).first()
 
     @staticmethod
     def get_ncm_by_code(ncm_code: str):
-        return NCM.objects.filter(code=ncm_code).first()
+        return reference_cache.get_ncm_by_code(ncm_code)
 
     @staticmethod
     def count_ncms() -> int:
         return NCM.objects.count()
 
     @staticmethod
-    def list_ncms():
-        ncms = NCM.objects.all()
-        count = ncms.count()
-        return {"count": count, "ncms": ncms}
+    def list_ncms(
+        group_id: Optional[uuid.UUID] = None,
+        code_prefix: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        ncms = NCM.objects.select_related("group")
+
+        if group_id is not None:
+            ncms = ncms.filter(group_id=group_id)
+
+        if code_prefix:
+            ncms = ncms.filter(code__startswith=code_prefix)
+
+        return paginate(ncms, ("code", "id"), cursor, limit, with_count).as_dict("ncms")
 
     def get_ncm(self, ncm_id: uuid.UUID):
         if not (ncm := self.get_ncm_by_id(ncm_id)):
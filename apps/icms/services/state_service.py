@@ -1,9 +1,12 @@
 import uuid
 from http import HTTPStatus
+from typing import Optional
 
 from ninja.errors import HttpError
 
 from apps.icms.models import State
+from utils.pagination import DEFAULT_LIMIT, paginate
+from utils.reference_cache import reference_cache
 
 
 class StateService:
@@ -16,13 +19,17 @@ class StateService:
 
     @staticmethod
     def get_state_by_code(state_code: str):
-        return State.objects.filter(code=state_code).first()
+        return reference_cache.get_state_by_code(state_code)
 
     @staticmethod
-    def list_states():
-        states = State.objects.all()
-        count = states.count()
-        return {"count": count, "states": states}
+    def list_states(
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        return paginate(
+            State.objects.all(), ("code", "id"), cursor, limit, with_count
+        ).as_dict("states")
 
     def get_state(self, state_id: uuid.UUID):
         if not (state := self.get_state_by_id(state_id)):
@@ -0,0 +1,82 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from apps.icms.models import ICMSRate, NCMGroup, State
+from apps.icms.services.icms_import_service import ICMSImportService
+
+
+@pytest.fixture
+def icms_import_service():
+    return ICMSImportService()
+
+
+@pytest.fixture
+def jwt():
+    return {"is_margin_admin": True}
+
+
+@pytest.fixture
+def rate_table():
+    first = NCMGroup.objects.create(name="Grupo 1")
+    second = NCMGroup.objects.create(name="Grupo 2")
+    acre = State.objects.create(name="Acre", code="AC")
+    State.objects.create(name="Alagoas", code="AL")
+    ICMSRate.objects.create(
+        state=acre, group=first, internal_rate=19, difal_rate=0, poverty_rate=0
+    )
+    return first, second
+
+
+def grid(*rows):
+    header = "UF;Grupo 1;;;Grupo 2;;\n;interno;difal;pobreza;interno;difal;pobreza\n"
+    return SimpleUploadedFile("icms.csv", (header + "\n".join(rows)).encode())
+
+
+@pytest.mark.django_db
+def test_import_icms_rates_dry_run(icms_import_service, jwt, rate_table):
+    file = grid("AC;19;0;0;17;2;0", "AL;19;0;1;17,5;2;0")
+    result = icms_import_service.import_icms_rates(jwt, file, dry_run=True)
+
+    assert (result["created"], result["updated"], result["unchanged"]) == (3, 0, 1)
+    assert result["applied"] is False
+    assert ICMSRate.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_icms_rates_applies_grid(icms_import_service, jwt, rate_table):
+    file = grid("AC;18;0;0;17;2;0", "AL;19;0;1;17,5;2;0")
+    result = icms_import_service.import_icms_rates(jwt, file)
+
+    assert result["applied"] is True
+    assert (result["created"], result["updated"]) == (3, 1)
+    assert (
+        ICMSRate.objects.get(state__code="AL", group__name="Grupo 2").total_rate == 19.5
+    )
+
+
+@pytest.mark.django_db
+def test_import_icms_rates_reports_errors(icms_import_service, jwt, rate_table):
+    file = grid("AC;18;0;0;17;2;0", "XX;19;0;1;17;2;0", "AL;19;abc;1;17;2;0")
+    result = icms_import_service.import_icms_rates(jwt, file)
+
+    assert result["applied"] is False
+    assert [(error["row"], error["column"]) for error in result["errors"]] == [
+        (4, 1),
+        (5, 3),
+    ]
+    assert ICMSRate.objects.get(state__code="AC").internal_rate == 19
+
+
+@pytest.mark.django_db
+def test_import_icms_rates_rejects_non_finite_rates(
+    icms_import_service, jwt, rate_table
+):
+    file = grid("AC;nan;0;0;17;2;0", "AL;19;0;1;Infinity;2;sNaN")
+    result = icms_import_service.import_icms_rates(jwt, file)
+
+    assert result["applied"] is False
+    assert [(error["row"], error["column"]) for error in result["errors"]] == [
+        (3, 2),
+        (4, 5),
+        (4, 7),
+    ]
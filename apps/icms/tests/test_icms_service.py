@@ -1,10 +1,19 @@
 import uuid
+from datetime import date
+from decimal import Decimal
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from ninja.errors import HttpError
 
 from apps.icms.models import ICMSRate, NCMGroup, State
-from apps.icms.schema import ICMSRateCreateSchema
+from apps.icms.schema import (
+    ICMSRateBulkCreateSchema,
+    ICMSRateBulkUpdateSchema,
+    ICMSRateCreateSchema,
+    ICMSRateUpdateSchema,
+)
 from apps.icms.services.icms_service import ICMSService
 
 
@@ -63,3 +72,266 @@ def test_list_icms_rates(icms_service):
 def test_get_icms_rate_not_found(icms_service):
     with pytest.raises(HttpError):
         icms_service.get_icms_rate(uuid.uuid4())
+
+
+@pytest.mark.django_db
+def test_get_rate_matrix(icms_service):
+    state = State.objects.create(name="Goiás", code="GO")
+    group = NCMGroup.objects.create(name="Group 7")
+    ICMSRate.objects.create(
+        state=state, group=group, internal_rate=17.0, difal_rate=2.0, poverty_rate=2.0
+    )
+    matrix = icms_service.get_rate_matrix()
+    assert [state.code for state in matrix["states"]] == ["GO"]
+    assert matrix["rates"]["GO"][str(group.id)] == [17, 2, 2, 21]
+
+
+@pytest.mark.django_db
+def test_list_icms_rates_by_total_rate(icms_service):
+    group = NCMGroup.objects.create(name="Group 8")
+    for code, internal_rate in (("AC", 12.0), ("AL", 19.0), ("AM", 20.0)):
+        state = State.objects.create(name=code, code=code)
+        ICMSRate.objects.create(
+            state=state,
+            group=group,
+            internal_rate=internal_rate,
+            difal_rate=1.0,
+            poverty_rate=0.5,
+        )
+    rates = icms_service.list_icms_rates(min_total_rate=20, ordering="-total_rate")
+    assert rates["count"] == 2
+    assert [rate.state.code for rate in rates["icms_rates"]] == ["AM", "AL"]
+    assert rates["icms_rates"][0].total_rate == Decimal("21.50")
+
+
+@pytest.mark.django_db
+def test_list_icms_rates_pages_keep_ordering(icms_service):
+    group = NCMGroup.objects.create(name="Group 9")
+    for code, internal_rate in (("PA", 12.0), ("PB", 19.0), ("PE", 19.0), ("PI", 7.0)):
+        state = State.objects.create(name=code, code=code)
+        ICMSRate.objects.create(
+            state=state,
+            group=group,
+            internal_rate=internal_rate,
+            difal_rate=1.0,
+            poverty_rate=0,
+        )
+
+    first = icms_service.list_icms_rates(ordering="-total_rate", limit=2)
+    second = icms_service.list_icms_rates(
+        ordering="-total_rate", cursor=first["next_cursor"], limit=2
+    )
+
+    assert first["count"] == 4
+    codes = [rate.state.code for rate in [*first["icms_rates"], *second["icms_rates"]]]
+    assert sorted(codes[:2]) == ["PB", "PE"] and codes[2:] == ["PA", "PI"]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.django_db
+def test_list_icms_rates_cursor_bounds_the_leading_field(icms_service):
+    group = NCMGroup.objects.create(name="Group 9")
+    for code in ("PA", "PB"):
+        ICMSRate.objects.create(
+            state=State.objects.create(name=code, code=code),
+            group=group,
+            internal_rate=12.0,
+            difal_rate=1.0,
+            poverty_rate=0,
+        )
+    first = icms_service.list_icms_rates(ordering="-total_rate", limit=1)
+
+    with CaptureQueriesContext(connection) as queries:
+        icms_service.list_icms_rates(
+            ordering="-total_rate", cursor=first["next_cursor"], with_count=False
+        )
+
+    # The redundant bound lets the database seek the total_rate index.
+    assert '"icms_icmsrate"."total_rate" <= ' in queries[0]["sql"]
+
+
+@pytest.mark.django_db
+def test_bulk_upsert_icms_rates(icms_service, jwt, django_assert_max_num_queries):
+    group = NCMGroup.objects.create(name="Group 9")
+    states = [State.objects.create(name=code, code=code) for code in ("AP", "CE", "DF")]
+    existing = ICMSRate.objects.create(
+        state=states[0], group=group, internal_rate=17, difal_rate=1, poverty_rate=0
+    )
+    payload = ICMSRateBulkCreateSchema(
+        rates=[
+            {
+                "state": state.id,
+                "group": group.id,
+                "internal_rate": 18.0,
+                "difal_rate": 2.0,
+                "poverty_rate": 1.0,
+            }
+            for state in states
+        ]
+    )
+
+    with django_assert_max_num_queries(8):
+        result = icms_service.bulk_upsert_icms_rates(jwt, payload)
+
+    assert result == {"created": 2, "updated": 1}
+    existing.refresh_from_db()
+    assert existing.total_rate == 21
+    assert ICMSRate.objects.filter(group=group, total_rate=21).count() == 3
+
+
+@pytest.mark.django_db
+def test_bulk_update_icms_rates_requires_existing(icms_service, jwt):
+    group = NCMGroup.objects.create(name="Group 10")
+    state = State.objects.create(name="Espírito Santo", code="ES")
+    payload = ICMSRateBulkUpdateSchema(
+        rates=[
+            {
+                "state": state.id,
+                "group": group.id,
+                "internal_rate": 17.0,
+                "difal_rate": 0.0,
+                "poverty_rate": 0.0,
+            }
+        ]
+    )
+    with pytest.raises(HttpError):
+        icms_service.bulk_update_icms_rates(jwt, payload)
+
+
+@pytest.mark.django_db
+def test_upsert_icms_rates_adds_effective_dated_version(icms_service, jwt):
+    group = NCMGroup.objects.create(name="Group 11")
+    state = State.objects.create(name="Maranhão", code="MA")
+    current = ICMSRate.objects.create(
+        state=state,
+        group=group,
+        internal_rate=20,
+        difal_rate=0,
+        poverty_rate=2,
+        valid_from=date(2024, 1, 1),
+    )
+    payload = ICMSRateBulkCreateSchema(
+        rates=[
+            {
+                "state": state.id,
+                "group": group.id,
+                "internal_rate": 22.0,
+                "difal_rate": 0.0,
+                "poverty_rate": 2.0,
+                "valid_from": date(2025, 4, 1),
+            }
+        ]
+    )
+
+    assert icms_service.bulk_upsert_icms_rates(jwt, payload) == {
+        "created": 0,
+        "updated": 1,
+    }
+    current.refresh_from_db()
+    assert current.valid_to == date(2025, 4, 1)
+    versions = ICMSRate.objects.filter(state=state, group=group)
+    assert versions.filter(ICMSRate.effective_on(date(2025, 3, 31))).get() == current
+    assert (
+        versions.filter(ICMSRate.effective_on(date(2025, 4, 1))).get().total_rate == 24
+    )
+    assert not versions.filter(ICMSRate.effective_on(date(2023, 12, 31))).exists()
+
+    matrix = icms_service.get_rate_matrix(date(2025, 3, 1))
+    assert matrix["rates"]["MA"][str(group.id)][3] == 22
+    assert icms_service.list_icms_rates(as_of=date(2025, 5, 1))["count"] == 1
+
+
+@pytest.fixture
+def dated_rate():
+    return ICMSRate.objects.create(
+        state=State.objects.create(name="Piauí", code="PI"),
+        group=NCMGroup.objects.create(name="Group 12"),
+        internal_rate=20,
+        difal_rate=0,
+        poverty_rate=1,
+        valid_from=date(2024, 1, 1),
+    )
+
+
+@pytest.mark.django_db
+def test_update_icms_rate_adds_version(icms_service, jwt, dated_rate):
+    payload = ICMSRateUpdateSchema(internal_rate=22.0, valid_from=date(2025, 4, 1))
+    icms_rate = icms_service.update_icms_rate(jwt, dated_rate.id, payload)
+
+    assert icms_rate.id != dated_rate.id
+    assert (icms_rate.total_rate, icms_rate.valid_to) == (23, None)
+    dated_rate.refresh_from_db()
+    assert (dated_rate.total_rate, dated_rate.valid_to) == (21, date(2025, 4, 1))
+
+
+@pytest.mark.django_db
+def test_update_icms_rate_keeps_state_and_group(icms_service, jwt, dated_rate):
+    other_state = State.objects.create(name="Paraná", code="PR")
+    payload = ICMSRateUpdateSchema(state=other_state.id, internal_rate=18.0)
+
+    with pytest.raises(HttpError) as error:
+        icms_service.update_icms_rate(jwt, dated_rate.id, payload)
+
+    assert error.value.status_code == 400
+    assert list(ICMSRate.objects.all()) == [dated_rate]
+    dated_rate.refresh_from_db()
+    assert (dated_rate.internal_rate, dated_rate.valid_to) == (20, None)
+
+
+@pytest.mark.django_db
+def test_update_icms_rate_edits_same_day_version(icms_service, jwt, dated_rate):
+    payload = ICMSRateUpdateSchema(poverty_rate=2.0, valid_from=date(2024, 1, 1))
+    icms_rate = icms_service.update_icms_rate(jwt, dated_rate.id, payload)
+
+    assert icms_rate.id == dated_rate.id
+    assert ICMSRate.objects.get().total_rate == 22
+
+
+@pytest.mark.django_db
+def test_icms_rate_versions_conflict(icms_service, jwt, dated_rate):
+    later = ICMSRate.objects.create(
+        state=dated_rate.state,
+        group=dated_rate.group,
+        internal_rate=21,
+        difal_rate=0,
+        poverty_rate=1,
+        valid_from=date(2025, 1, 1),
+    )
+    create_payload = ICMSRateCreateSchema(
+        state=dated_rate.state_id,
+        group=dated_rate.group_id,
+        internal_rate=18.0,
+        difal_rate=0.0,
+        poverty_rate=0.0,
+        valid_from=date(2024, 1, 1),
+    )
+    with pytest.raises(HttpError) as create_error:
+        icms_service.create_icms_rate(jwt, create_payload)
+
+    update_payload = ICMSRateUpdateSchema(valid_from=date(2025, 1, 1))
+    with pytest.raises(HttpError) as update_error:
+        icms_service.update_icms_rate(jwt, dated_rate.id, update_payload)
+
+    assert create_error.value.status_code == update_error.value.status_code == 409
+    assert ICMSRate.objects.count() == 2
+    later.refresh_from_db()
+    assert later.total_rate == 22
+
+
+@pytest.mark.django_db
+def test_bulk_update_icms_rates_counts_new_versions(icms_service, jwt, dated_rate):
+    payload = ICMSRateBulkUpdateSchema(
+        rates=[
+            {
+                "state": dated_rate.state_id,
+                "group": dated_rate.group_id,
+                "internal_rate": 19.0,
+                "difal_rate": 0.0,
+                "poverty_rate": 1.0,
+            }
+        ]
+    )
+    response = icms_service.bulk_update_icms_rates(jwt, payload)
+
+    assert b"1 registros atualizados" in response.content
+    assert ICMSRate.objects.count() == 2
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from ninja.errors import HttpError
+
+from apps.icms.models import NCMCatalogEntry, NCMGroup
+from apps.icms.schema import NCMSCreateSchema
+from apps.icms.services.ncm_catalog_service import NCMCatalogService
+from apps.icms.services.ncm_service import NCMService
+
+
+@pytest.fixture
+def catalog_service():
+    return NCMCatalogService()
+
+
+@pytest.fixture
+def jwt():
+    return {"is_margin_admin": True}
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    path = tmp_path / "ncm.json"
+    path.write_text(
+        json.dumps(
+            {
+                "Nomenclaturas": [
+                    {"Codigo": "85", "Descricao": "Máquinas elétricas"},
+                    {"Codigo": "8504.40", "Descricao": "- Conversores"},
+                    {"Codigo": "8504.40.90", "Descricao": "-- Outros"},
+                ]
+            }
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+@pytest.mark.django_db
+def test_load_file_keeps_only_full_codes(catalog_service, catalog_file):
+    assert catalog_service.load_file(catalog_file) == 1
+    assert NCMCatalogEntry.objects.get().code == "8504.40.90"
+
+
+@pytest.mark.django_db
+def test_create_ncm_validates_against_catalog(
+    catalog_service, catalog_file, jwt, mocker
+):
+    catalog_service.load_file(catalog_file)
+    brasil_api = mocker.patch(
+        "utils.brasil_api_service.BrasilAPIService.get_ncm",
+        side_effect=ConnectionError,
+    )
+    group = NCMGroup.objects.create(name="Group 1")
+    ncm_service = NCMService()
+
+    ncm = ncm_service.create_ncm(
+        jwt, NCMSCreateSchema(code="8504.40.90", group=group.id)
+    )
+    assert ncm.code == "8504.40.90"
+
+    with pytest.raises(HttpError):
+        ncm_service.create_ncm(jwt, NCMSCreateSchema(code="8504.40.10", group=group.id))
+
+    brasil_api.assert_not_called()
@@ -1,9 +1,11 @@
 import uuid
 
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from ninja.errors import HttpError
 
-from apps.icms.models import NCM, NCMGroup
+from apps.icms.models import NCM, NCMCatalogEntry, NCMGroup
+from apps.icms.schema import NCMBulkCreateSchema
 from apps.icms.services.ncm_service import NCMService
 
 
@@ -35,7 +37,119 @@ def test_list_ncm_groups(ncm_service):
     assert groups["ncm_groups"][0].name == "Group 3"
 
 
+@pytest.mark.django_db
+def test_list_ncms_walks_pages_by_cursor(ncm_service, django_assert_num_queries):
+    group = NCMGroup.objects.create(name="Group 10")
+    other = NCMGroup.objects.create(name="Group 11")
+    for code in ("8504.10.00", "8504.40.90", "8504.40.10", "8536.10.00", "8504.90.00"):
+        NCM.objects.create(code=code, group=group)
+    NCM.objects.create(code="8504.20.00", group=other)
+
+    codes = []
+    cursor = None
+    while True:
+        with django_assert_num_queries(1):
+            page = ncm_service.list_ncms(
+                group_id=group.id,
+                code_prefix="8504",
+                cursor=cursor,
+                limit=2,
+                with_count=False,
+            )
+            codes += [ncm.code for ncm in page["ncms"]]
+        assert page["count"] is None
+        if not (cursor := page["next_cursor"]):
+            break
+
+    assert codes == ["8504.10.00", "8504.40.10", "8504.40.90", "8504.90.00"]
+
+
+@pytest.mark.django_db
+def test_list_ncms_rejects_foreign_cursor(ncm_service):
+    NCMGroup.objects.bulk_create([NCMGroup(name="Group 12"), NCMGroup(name="Group 13")])
+    cursor = ncm_service.list_ncm_groups(limit=1)["next_cursor"]
+
+    with pytest.raises(HttpError) as exc:
+        ncm_service.list_ncms(cursor=cursor)
+    assert exc.value.status_code == 400
+
+
 @pytest.mark.django_db
 def test_get_ncm_group_not_found(ncm_service):
     with pytest.raises(HttpError):
         ncm_service.get_ncm_group(uuid.uuid4())
+
+
+@pytest.fixture
+def jwt():
+    return {"is_margin_admin": True}
+
+
+@pytest.mark.django_db
+def test_bulk_create_ncms(ncm_service, jwt):
+    group = NCMGroup.objects.create(name="Group 4")
+    NCM.objects.create(code="8504.40.10", group=group)
+    NCMCatalogEntry.objects.bulk_create(
+        NCMCatalogEntry(code=code) for code in ("8504.40.10", "8504.40.90")
+    )
+    payload = NCMBulkCreateSchema(
+        group=group.id,
+        ncms=[
+            {"code": "8504.40.90"},
+            {"code": "8504.40.10"},
+            {"code": "8504.40.20"},
+            {"code": "850440"},
+        ],
+    )
+    result = ncm_service.bulk_create_ncms(jwt, payload)
+    assert result["created"] == 1
+    assert [error["row"] for error in result["errors"]] == [2, 3, 4]
+    assert NCM.objects.filter(group=group).count() == 2
+
+
+@pytest.mark.django_db
+def test_import_ncms_csv(ncm_service, jwt):
+    NCMGroup.objects.create(name="Group 5")
+    NCMCatalogEntry.objects.bulk_create(
+        NCMCatalogEntry(code=code) for code in ("8504.40.10", "8504.40.90")
+    )
+    file = SimpleUploadedFile(
+        "ncms.csv",
+        "codigo;grupo\n8504.40.10;Group 5\n\n8504.40.90;Missing\n".encode(),
+    )
+    result = ncm_service.import_ncms_csv(jwt, file)
+    assert result["created"] == 1
+    assert result["errors"] == [
+        {"row": 4, "code": "8504.40.90", "detail": "Grupo de NCM não encontrado"}
+    ]
+
+
+@pytest.mark.django_db
+def test_import_ncms_csv_default_group_fills_empty_cells_only(ncm_service, jwt):
+    default = NCMGroup.objects.create(name="Default")
+    NCMCatalogEntry.objects.bulk_create(
+        NCMCatalogEntry(code=code) for code in ("8504.40.10", "8504.40.90")
+    )
+    file = SimpleUploadedFile("ncms.csv", "8504.40.10;\n8504.40.90;Typo\n".encode())
+    result = ncm_service.import_ncms_csv(jwt, file, group_id=default.id)
+
+    assert result["created"] == 1
+    assert NCM.objects.get().group == default
+    assert result["errors"] == [
+        {"row": 2, "code": "8504.40.90", "detail": "Grupo de NCM não encontrado"}
+    ]
+
+
+@pytest.mark.django_db
+def test_bulk_create_ncms_requires_catalog(ncm_service, jwt, mocker):
+    get_ncm = mocker.patch.object(
+        ncm_service.validation_service.brasil_api_service, "get_ncm"
+    )
+    payload = NCMBulkCreateSchema(ncms=[{"code": "8504.40.90"}])
+
+    with pytest.raises(HttpError) as error:
+        ncm_service.bulk_create_ncms(jwt, payload)
+
+    assert error.value.status_code == 400
+    assert "Catálogo de NCM não carregado" in error.value.message
+    get_ncm.assert_not_called()
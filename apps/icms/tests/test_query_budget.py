@@ -0,0 +1,83 @@
+import pytest
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from jose import jwt
+
+from apps.icms.models import NCM, ICMSRate, NCMGroup, State
+from apps.margin.models import Company, Percentage
+from apps.taxes.models import Tax
+from core import settings as core_settings
+from utils.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware
+from utils.reference_cache import reference_cache
+
+ENDPOINTS = (
+    "/api/states",
+    "/api/ncm",
+    "/api/ncm/groups",
+    "/api/icms/rates",
+    "/api/icms/rates/group/{group_id}",
+    "/api/taxes",
+    "/api/companies",
+    "/api/percentages",
+    "/api/states/{state_id}",
+    "/api/ncm/{ncm_id}",
+    "/api/ncm/groups/{group_id}",
+    "/api/icms/rates/{icms_rate_id}",
+)
+
+
+@pytest.fixture
+def reference_rows():
+    groups = [NCMGroup.objects.create(name=f"Group {index}") for index in range(4)]
+    states = [
+        State.objects.create(name=f"State {index}", code=f"S{index}")
+        for index in range(4)
+    ]
+    for index in range(12):
+        NCM.objects.create(code=f"{index:08d}", group=groups[index % 4])
+    for state in states:
+        for group in groups:
+            ICMSRate.objects.create(
+                state=state, group=group, internal_rate=12, difal_rate=6, poverty_rate=0
+            )
+    for index in range(4):
+        Company.objects.create(name=f"Company {index}", profit_type="real")
+        Percentage.objects.create(value=index)
+        Tax.objects.create(
+            name=f"Tax {index}", presumed_profit_rate=1, real_profit_rate=2
+        )
+    return {
+        "group_id": groups[0].id,
+        "state_id": states[0].id,
+        "ncm_id": NCM.objects.first().id,
+        "icms_rate_id": ICMSRate.objects.first().id,
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_endpoints_stay_within_query_budget(client, reference_rows, endpoint):
+    token = jwt.encode({"email": "user@gimi.com.br"}, core_settings.SECRET_KEY)
+    # Budgets describe the steady state, so the one-off cold load of the
+    # reference cache must not count against them.
+    reference_cache.snapshot()
+
+    response = client.get(
+        endpoint.format(**reference_rows),
+        HTTP_AUTHORIZATION=f"Bearer {token}",
+    )
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_middleware_fails_requests_over_budget():
+    def view(request):
+        request.query_budget = 1
+        for _ in range(2):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        return HttpResponse()
+
+    with pytest.raises(QueryBudgetExceeded, match="ran 2 queries"):
+        QueryBudgetMiddleware(view)(HttpRequest())
@@ -0,0 +1,70 @@
+from datetime import date
+
+import pytest
+
+from apps.icms.models import NCM, ICMSRate, NCMGroup, ReferenceDataVersion, State
+from utils.reference_cache import ReferenceDataCache
+
+
+@pytest.fixture
+def cache():
+    return ReferenceDataCache()
+
+
+@pytest.mark.django_db
+def test_reference_cache_hits_after_first_load(cache, django_assert_num_queries):
+    State.objects.create(name="Paraná", code="PR")
+    cache.get_state_by_code("PR")
+
+    with django_assert_num_queries(0):
+        assert cache.get_state_by_code("PR").name == "Paraná"
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_reference_cache_resolves_icms_rate(cache):
+    state = State.objects.create(name="Bahia", code="BA")
+    group = NCMGroup.objects.create(name="Group 1")
+    ncm = NCM.objects.create(code="8504.40.90", group=group)
+    rate = ICMSRate.objects.create(
+        state=state, group=group, internal_rate=18, difal_rate=2, poverty_rate=1
+    )
+
+    assert cache.get_ncm_by_code(ncm.code).group == group
+    entry = cache.get_rate_entry(state.code, ncm.code)
+    assert entry.rate == rate
+    assert entry.total_rate == 21
+
+
+@pytest.mark.django_db
+def test_reference_cache_resolves_rate_as_of_date(cache):
+    state = State.objects.create(name="Bahia", code="BA")
+    group = NCMGroup.objects.create(name="Group 1")
+    ncm = NCM.objects.create(code="8504.40.90", group=group)
+    for valid_from, internal_rate in ((date(2024, 1, 1), 18), (date(2025, 1, 1), 20)):
+        ICMSRate.objects.create(
+            state=state,
+            group=group,
+            internal_rate=internal_rate,
+            difal_rate=0,
+            poverty_rate=0,
+            valid_from=valid_from,
+        )
+
+    assert cache.get_rate_entry("BA", ncm.code, date(2023, 6, 1)) is None
+    assert cache.get_rate_entry("BA", ncm.code, date(2024, 12, 31)).total_rate == 18
+    assert cache.get_rate_entry("BA", ncm.code, date(2025, 1, 1)).total_rate == 20
+
+
+@pytest.mark.django_db
+def test_reference_cache_reloads_on_version_change(cache):
+    State.objects.create(name="Paraná", code="PR")
+    version = ReferenceDataVersion.current()
+    assert cache.snapshot().version == version
+
+    ReferenceDataVersion.bump()
+    cache.VERSION_CHECK_INTERVAL = 0
+
+    assert cache.snapshot().version == version + 1
+    assert cache.misses == 2
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import Company, Percentage, Contract, ContractItem
+from .models import (
+    Company,
+    Contract,
+    ContractItem,
+    EmailOutbox,
+    Percentage,
+    RepricingJob,
+)
+from .services.repricing_service import RepricingService
 
 
 @admin.register(Company)
@@ -15,6 +23,17 @@ class PercentageAdmin(admin.ModelAdmin):
     list_display = ("value",)
     search_fields = ("value",)
     ordering = ("value",)
+    actions = ["reprice_contracts"]
+
+    @admin.action(description="Reprecificar contratos afetados")
+    def reprice_contracts(self, request, queryset):
+        service = RepricingService()
+        job = service.create_job(
+            "Alteração de percentual",
+            percentages=list(queryset.values_list("id", flat=True)),
+        )
+        service.start_in_background(job)
+        self.message_user(request, f"Reprecificação {job.pk} iniciada.")
 
 
 class ContractItemInline(admin.TabularInline):
@@ -55,3 +74,46 @@ class ContractItemAdmin(admin.ModelAdmin):
     list_filter = ("contract",)
     search_fields = ("name", "contract__contract_number")
     ordering = ("contract", "index")
+
+
+@admin.register(RepricingJob)
+class RepricingJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "reason",
+        "status",
+        "processed",
+        "failed",
+        "total",
+        "started_at",
+        "finished_at",
+    )
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "status",
+        "total",
+        "processed",
+        "failed",
+        "cursor",
+        "error",
+        "started_at",
+        "finished_at",
+        "heartbeat_at",
+    )
+    actions = ["resume_jobs"]
+
+    @admin.action(description="Retomar reprecificação")
+    def resume_jobs(self, request, queryset):
+        service = RepricingService()
+        for job in service.resumable_jobs().filter(pk__in=queryset.values("pk")):
+            service.start_in_background(job)
+        self.message_user(request, "Reprecificações retomadas.")
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject",)
+    ordering = ("-created_at",)
+    readonly_fields = ("attempts", "last_error", "sent_at")
@@ -1,7 +1,8 @@
 import uuid
 from http import HTTPStatus
+from typing import Optional
 
-from ninja import Router
+from ninja import Query, Router
 
 from apps.margin.schema import (
     CompanyCreateSchema,
@@ -9,8 +10,16 @@ from apps.margin.schema import (
     CompanySchema,
     CompanyUpdateSchema,
     ContractCalculateSchema,
+    ContractFindBatchCreateSchema,
+    ContractFindBatchSchema,
     ContractFindSchema,
+    ContractMarginSolutionSchema,
+    ContractMarginSolveCreateSchema,
+    ContractMarginSolveSchema,
+    ContractReturnBatchCreateSchema,
+    ContractReturnBatchSchema,
     ContractReturnSchema,
+    ContractSimulationSchema,
     PercentageListSchema,
     PercentageSchema,
     PercentageUpdateSchema,
@@ -18,8 +27,9 @@ from apps.margin.schema import (
 from apps.margin.services.company_service import CompanyService
 from apps.margin.services.contract_service import ContractService
 from apps.margin.services.percentage_service import PercentageService
-from utils.base_schema import ErrorSchema
+from utils.base_schema import ErrorSchema, PaginationQuerySchema
 from utils.jwt import JWTAuth, decode_jwt_token
+from utils.query_budget import query_budget
 
 company_router = Router(auth=JWTAuth())
 company_service = CompanyService()
@@ -46,11 +56,17 @@ def create_company(request, payload: CompanyCreateSchema):
 
 
 @company_router.get(
-    "", response={HTTPStatus.OK: CompanyListSchema, HTTPStatus.FORBIDDEN: ErrorSchema}
+    "",
+    response={
+        HTTPStatus.OK: CompanyListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_companies(request):
+@query_budget(2)
+def list_companies(request, page: PaginationQuerySchema = Query(...)):
     decode_jwt_token(request.headers.get("Authorization"))
-    return company_service.list_companies()
+    return company_service.list_companies(**page.dict())
 
 
 @company_router.get(
@@ -97,11 +113,16 @@ def delete_company(request, company_id: uuid.UUID):
 
 @percentage_router.get(
     "",
-    response={HTTPStatus.OK: PercentageListSchema, HTTPStatus.FORBIDDEN: ErrorSchema},
+    response={
+        HTTPStatus.OK: PercentageListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_percentages(request):
+@query_budget(2)
+def list_percentages(request, page: PaginationQuerySchema = Query(...)):
     decode_jwt_token(request.headers.get("Authorization"))
-    return percentage_service.list_percentages()
+    return percentage_service.list_percentages(**page.dict())
 
 
 @percentage_router.get(
@@ -149,6 +170,21 @@ def find_iapp_contract(request, company_id: uuid.UUID, contract: str):
     return contract_service.find_iapp_contract(company_id, contract)
 
 
+@contract_router.post(
+    "/find/batch",
+    response={
+        HTTPStatus.OK: ContractFindBatchSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+        HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
+    },
+)
+def find_iapp_contracts(request, payload: ContractFindBatchCreateSchema):
+    decode_jwt_token(request.headers.get("Authorization"))
+    return contract_service.find_iapp_contracts(payload.company_id, payload.contracts)
+
+
 @contract_router.get(
     "/calculate",
     response={
@@ -164,6 +200,56 @@ def calculate_iapp_contract(request, contract_id: uuid.UUID, percentage_id: uuid
     return contract_service.calculate_iapp_contract(contract_id, percentage_id)
 
 
+@contract_router.get(
+    "/simulate",
+    response={
+        HTTPStatus.OK: ContractSimulationSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def simulate_iapp_contract(
+    request, contract_id: uuid.UUID, margins: Optional[list[float]] = Query(None)
+):
+    decode_jwt_token(request.headers.get("Authorization"))
+    return contract_service.simulate_iapp_contract(contract_id, margins)
+
+
+@contract_router.get(
+    "/margin",
+    response={
+        HTTPStatus.OK: ContractMarginSolutionSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def solve_iapp_contract_margin(request, contract_id: uuid.UUID, target_price: float):
+    decode_jwt_token(request.headers.get("Authorization"))
+    [solution] = contract_service.solve_iapp_contract_margins(
+        [(contract_id, target_price)]
+    )
+    return solution
+
+
+@contract_router.post(
+    "/margin/batch",
+    response={
+        HTTPStatus.OK: ContractMarginSolveSchema,
+        HTTPStatus.NOT_FOUND: ErrorSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def solve_iapp_contract_margins(request, payload: ContractMarginSolveCreateSchema):
+    decode_jwt_token(request.headers.get("Authorization"))
+    solutions = contract_service.solve_iapp_contract_margins(
+        [(target.contract_id, target.target_price) for target in payload.targets]
+    )
+    return {"solutions": solutions}
+
+
 @contract_router.get(
     "/return",
     response={
@@ -172,6 +258,7 @@ def calculate_iapp_contract(request, contract_id: uuid.UUID, percentage_id: uuid
         HTTPStatus.FORBIDDEN: ErrorSchema,
         HTTPStatus.BAD_REQUEST: ErrorSchema,
         HTTPStatus.INTERNAL_SERVER_ERROR: ErrorSchema,
+        HTTPStatus.GATEWAY_TIMEOUT: ErrorSchema,
     },
 )
 def return_iapp_contract(request, contract_id: uuid.UUID):
@@ -179,3 +266,20 @@ def return_iapp_contract(request, contract_id: uuid.UUID):
     user_email = jwt.get("email")
     token = request.headers.get("Authorization").split(" ")[1]
     return contract_service.return_iapp_contract(contract_id, user_email, token)
+
+
+@contract_router.post(
+    "/return/batch",
+    response={
+        HTTPStatus.OK: ContractReturnBatchSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
+)
+def return_iapp_contracts(request, payload: ContractReturnBatchCreateSchema):
+    jwt = decode_jwt_token(request.headers.get("Authorization"))
+    user_email = jwt.get("email")
+    token = request.headers.get("Authorization").split(" ")[1]
+    return contract_service.return_iapp_contracts(
+        payload.contract_ids, user_email, token
+    )
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from ninja.errors import HttpError
+
+from apps.icms.models import ICMSRate
+from apps.margin.models import RepricingJob
+from apps.margin.services.repricing_service import RepricingService
+
+
+class Command(BaseCommand):
+    help = "Reprice stored contracts after ICMS rates, taxes or percentages change."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--icms-rate",
+            action="append",
+            default=[],
+            help="Only contracts priced with this rate's state and NCM group.",
+        )
+        parser.add_argument(
+            "--percentage",
+            action="append",
+            default=[],
+            help="Only contracts calculated with this percentage.",
+        )
+        parser.add_argument("--reason", default="")
+        parser.add_argument("--resume", help="Resume an interrupted job by its id.")
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help=(
+                "Run every job not finished yet, including running jobs whose "
+                "worker stopped sending heartbeats."
+            ),
+        )
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument(
+            "--chunk-size", type=int, default=RepricingService.CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        service = RepricingService()
+
+        if options["resume"]:
+            jobs = RepricingJob.objects.filter(pk=options["resume"])
+            if not jobs:
+                raise CommandError(
+                    f"Reprecificação {options['resume']} não encontrada."
+                )
+        elif options["pending"]:
+            jobs = service.resumable_jobs().order_by("created_at")
+        else:
+            state_groups = ICMSRate.objects.filter(
+                pk__in=options["icms_rate"]
+            ).values_list("state_id", "group_id")
+            if len(state_groups) != len(set(options["icms_rate"])):
+                raise CommandError("Taxa de ICMS não encontrada.")
+            jobs = [
+                service.create_job(
+                    options["reason"], list(state_groups), options["percentage"]
+                )
+            ]
+
+        for job in jobs:
+            try:
+                job = service.run(
+                    job.pk,
+                    workers=options["workers"],
+                    chunk_size=options["chunk_size"],
+                    progress=self.report_progress,
+                )
+            except HttpError as exc:
+                raise CommandError(exc.message) from exc
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Reprecificação {job.pk}: {job.processed} contratos atualizados, "
+                    f"{job.failed} com erro."
+                )
+            )
+
+    def report_progress(self, job):
+        self.stdout.write(f"{job.processed + job.failed}/{job.total} contratos")
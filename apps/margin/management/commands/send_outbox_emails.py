@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from apps.margin.services.email_service import EmailService
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued emails from the outbox, reusing one SMTP connection per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send the messages due now and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument("--batch-size", type=int, default=EmailService.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        service = EmailService()
+
+        while True:
+            try:
+                result = service.send_outbox(options["batch_size"])
+            except Exception as exc:
+                # Claimed messages go back to the queue when their lease expires.
+                if options["once"]:
+                    raise CommandError(f"Erro ao enviar e-mails: {exc}") from exc
+                self.stderr.write(f"Erro ao enviar e-mails: {exc}")
+                close_old_connections()
+                time.sleep(options["interval"])
+                continue
+
+            if processed := result["sent"] + result["retried"]:
+                self.stdout.write(
+                    f"{result['sent']} e-mails enviados, "
+                    f"{result['retried']} reagendados."
+                )
+
+            if not processed:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.14 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("margin", "0003_alter_percentage_value"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="payload_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                fields=["company", "contract_id"], name="contract_company_iapp_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.14 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("margin", "0006_emailoutbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repricingjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from apps.icms.models import NCM, ICMSRate, State
 from utils.base_model import BaseModel
@@ -55,10 +56,25 @@ class Contract(BaseModel):
         blank=True,
         related_name="contracts",
     )
+    payload_hash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"Contract {self.contract_number} - {self.company}"
 
+    @property
+    def iapp_url(self):
+        return (
+            "https://iapp.iniciativaaplicativos.com.br/comercial/contratos/"
+            f"editar?id={self.contract_id}"
+        )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["company", "contract_id"], name="contract_company_iapp_idx"
+            )
+        ]
+
 
 class ContractItem(BaseModel):
     contract = models.ForeignKey(
@@ -74,3 +90,59 @@ class ContractItem(BaseModel):
 
     def __str__(self):
         return f"Item {self.index} - {self.name} ({self.contract.contract_number})"
+
+
+class RepricingJob(BaseModel):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    reason = models.CharField(max_length=255, blank=True, default="")
+    scope = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    cursor = models.UUIDField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed after every range; a running job that stops beating was killed.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Repricing {self.reason or self.id} ({self.status})"
+
+
+class EmailOutbox(BaseModel):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time while pending; lease expiry while a worker holds the message.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"], name="email_outbox_due_idx"
+            )
+        ]
@@ -0,0 +1,96 @@
+"""Markup pricing kernel shared by calculation, simulation and repricing.
+
+Every function takes columns (equal-length sequences) instead of model
+instances, so a whole portfolio or every margin of a simulation is priced in
+one call without touching the ORM. Rates are percentages (``18`` for 18%).
+
+The sale price is::
+
+    (net_cost_without_taxes + freight) / (1 - (icms + other_taxes + margin + commission) / 100)
+
+Rounding happens once, on the sale price: it is rounded *up* to the next
+whole currency unit, except that anything at most half a cent above a
+whole unit stays at that unit. That tolerance absorbs binary floating point
+noise such as ``1000.0000000001``. Item values are the item's share
+(``contribution_rate``) of the whole sale price and are not rounded, so they
+always add up to it.
+"""
+
+import math
+from collections.abc import Sequence
+
+PRICE_TOLERANCE = 0.005
+
+
+class InvalidMarkupError(ValueError):
+    """A row can't be priced: its rates reach 100% or its target price isn't positive."""
+
+    def __init__(self, index: int):
+        super().__init__(f"Row {index} can't be priced.")
+        self.index = index
+
+
+def round_sale_price(raw_price: float) -> int:
+    """The one rounding rule for sale prices; see the module docstring."""
+    return math.ceil(raw_price - PRICE_TOLERANCE)
+
+
+def sale_prices(
+    net_costs: Sequence[float],
+    freights: Sequence[float],
+    icms_rates: Sequence[float],
+    other_taxes: Sequence[float],
+    commissions: Sequence[float],
+    margins: Sequence[float],
+) -> list[int]:
+    """Whole sale price of each row; raises ``InvalidMarkupError`` on the first bad row."""
+    columns = (net_costs, freights, icms_rates, other_taxes, commissions, margins)
+    if len({len(column) for column in columns}) > 1:
+        raise ValueError("All pricing columns must have the same length.")
+
+    round_price = round_sale_price
+    prices = []
+    for index, (cost, freight, icms, taxes, commission, margin) in enumerate(
+        zip(*columns)
+    ):
+        divisor = 100 - icms - taxes - commission - margin
+        if divisor <= 0:
+            raise InvalidMarkupError(index)
+        prices.append(round_price((cost + freight) * 100 / divisor))
+
+    return prices
+
+
+def implied_margins(
+    net_costs: Sequence[float],
+    freights: Sequence[float],
+    icms_rates: Sequence[float],
+    other_taxes: Sequence[float],
+    commissions: Sequence[float],
+    target_prices: Sequence[float],
+) -> list[float]:
+    """Margin (%) that makes the unrounded sale price equal each target price.
+
+    The markup formula solved for the margin::
+
+        margin = 100 * (1 - (net_cost_without_taxes + freight) / target_price)
+                 - icms - other_taxes - commission
+    """
+    columns = (net_costs, freights, icms_rates, other_taxes, commissions, target_prices)
+    if len({len(column) for column in columns}) > 1:
+        raise ValueError("All pricing columns must have the same length.")
+
+    margins = []
+    for index, (cost, freight, icms, taxes, commission, price) in enumerate(
+        zip(*columns)
+    ):
+        if price <= 0:
+            raise InvalidMarkupError(index)
+        margins.append(100 - (cost + freight) * 100 / price - icms - taxes - commission)
+
+    return margins
+
+
+def item_values(sale_price: float, contribution_rates: Sequence[float]) -> list[float]:
+    share = sale_price / 100
+    return [share * rate for rate in contribution_rates]
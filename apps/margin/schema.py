@@ -19,7 +19,8 @@ class CompanySchema(CompanyCreateSchema):
 
 
 class CompanyListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     companies: list[CompanySchema]
 
 
@@ -34,7 +35,8 @@ class PercentageSchema(Schema):
 
 
 class PercentageListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     percentages: list[PercentageSchema]
 
 
@@ -78,6 +80,22 @@ class ContractFindSchema(Schema):
     items: list[ProductFindSchema]
 
 
+class ContractFindBatchCreateSchema(Schema):
+    company_id: uuid.UUID
+    contracts: list[str]
+
+
+class ContractBatchErrorSchema(Schema):
+    contract: str
+    status: int
+    detail: str
+
+
+class ContractFindBatchSchema(Schema):
+    contracts: list[ContractFindSchema]
+    errors: list[ContractBatchErrorSchema]
+
+
 class ContractCalculateSchema(Schema):
     id: uuid.UUID
     contract_number: str
@@ -97,6 +115,72 @@ class ContractCalculateSchema(Schema):
     items: list[ProductCalculateSchema]
 
 
+class ProductSimulationSchema(Schema):
+    id: uuid.UUID
+    index: int
+    name: str
+    updated_value: float
+
+
+class MarginSimulationSchema(Schema):
+    percentage_id: Optional[uuid.UUID] = None
+    margin: float
+    net_cost_with_margin: float
+    items: list[ProductSimulationSchema]
+
+
+class ContractSimulationSchema(Schema):
+    id: uuid.UUID
+    contract_number: str
+    net_cost_without_taxes: float
+    freight_value: float
+    commission: float
+    icms: ICMSRateContractSchema
+    other_taxes: float
+    simulations: list[MarginSimulationSchema]
+
+
+class ContractMarginTargetSchema(Schema):
+    contract_id: uuid.UUID
+    target_price: float
+
+
+class ContractMarginSolveCreateSchema(Schema):
+    targets: list[ContractMarginTargetSchema]
+
+
+class ContractMarginSolutionSchema(ContractMarginTargetSchema):
+    margin: float
+    percentage: Optional[PercentageSchema] = None
+
+
+class ContractMarginSolveSchema(Schema):
+    solutions: list[ContractMarginSolutionSchema]
+
+
+class ContractReturnStageSchema(Schema):
+    stage: str
+    status: str
+    detail: Optional[str] = None
+
+
 class ContractReturnSchema(Schema):
     detail: str
     url: str
+    stages: list[ContractReturnStageSchema]
+
+
+class ContractReturnBatchCreateSchema(Schema):
+    contract_ids: list[uuid.UUID]
+
+
+class ContractReturnedSchema(Schema):
+    id: uuid.UUID
+    contract_number: str
+    url: str
+
+
+class ContractReturnBatchSchema(Schema):
+    contracts: list[ContractReturnedSchema]
+    errors: list[ContractBatchErrorSchema]
+    stages: list[ContractReturnStageSchema]
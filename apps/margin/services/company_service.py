@@ -1,11 +1,14 @@
 import uuid
 from http import HTTPStatus
+from typing import Optional
 from django.db import IntegrityError
 from django.http import JsonResponse
 from ninja.errors import HttpError
 
 from apps.margin.models import Company
 from apps.margin.schema import CompanyCreateSchema, CompanyUpdateSchema
+from utils.pagination import DEFAULT_LIMIT, paginate
+from utils.reference_cache import reference_cache
 from utils.validation import ValidationService
 
 
@@ -22,14 +25,14 @@ class CompanyService:
         return Company.objects.count()
 
     @staticmethod
-    def list_companies():
-        companies = Company.objects.all()
-        count = companies.count()
-
-        return {
-            "count": count,
-            "companies": companies,
-        }
+    def list_companies(
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        return paginate(
+            Company.objects.all(), ("name", "id"), cursor, limit, with_count
+        ).as_dict("companies")
 
     def get_company(self, company_id: uuid.UUID):
         if not (company := self.get_company_by_id(company_id)):
@@ -37,6 +40,12 @@ class CompanyService:
 
         return company
 
+    def get_cached_company(self, company_id: uuid.UUID):
+        if not (company := reference_cache.get_company(company_id)):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Empresa não encontrada")
+
+        return company
+
     def create_company(self, jwt: dict, payload: CompanyCreateSchema):
         if not self.validation_service.validate_user_access(jwt):
             raise HttpError(HTTPStatus.FORBIDDEN, "Usuário não autorizado")
@@ -1,24 +1,69 @@
-import os
+import hashlib
+import json
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from http import HTTPStatus
+from typing import Optional
 
-import requests
-from django.db import transaction
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
 from ninja.errors import HttpError
 
 from apps.icms.services.icms_service import ICMSService
 from apps.icms.services.ncm_service import NCMService
 from apps.icms.services.state_service import StateService
-from apps.margin.models import Contract, ContractItem
+from apps.margin import pricing
+from apps.margin.models import Contract, ContractItem, Percentage
 from apps.margin.services.company_service import CompanyService
 from apps.margin.services.email_service import EmailService
 from apps.margin.services.percentage_service import PercentageService
-from apps.taxes.models import Tax
 from utils.gimix_service import GIMIxService
+from utils.iapp_service import IAppService
+from utils.reference_cache import reference_cache
 
 
 class ContractService:
+    MAX_BATCH_SIZE = 50
+    MAX_BATCH_WORKERS = 8
+    MAX_SIMULATED_MARGINS = 50
+    MAX_SOLVE_BATCH_SIZE = 500
+    RETURN_DEADLINE = 30
+    MAX_RETURN_WORKERS_PER_COMPANY = 4
+    CONTRACT_FIELDS = (
+        "contract_id",
+        "contract_number",
+        "company",
+        "client_name",
+        "client_id",
+        "construction_name",
+        "delivery_date",
+        "net_cost",
+        "net_cost_without_taxes",
+        "net_cost_with_margin",
+        "freight_value",
+        "commission",
+        "state",
+        "ncm",
+        "icms",
+        "other_taxes",
+        "account",
+        "installments",
+        "xped",
+        "margin",
+    )
+    ITEM_FIELDS = (
+        "index",
+        "name",
+        "contribution_rate",
+        "sale_item_id",
+        "quantity",
+        "product_id",
+        "updated_value",
+    )
+
     def __init__(self):
         self.ncm_service = NCMService()
         self.state_service = StateService()
@@ -27,29 +72,238 @@ class ContractService:
         self.percentage_service = PercentageService()
         self.email_service = EmailService()
         self.gimix_service = GIMIxService()
+        self.iapp_service = IAppService()
 
     @staticmethod
-    def get_contract_by_id(contract_id: uuid.UUID):
-        return Contract.objects.filter(pk=contract_id).first()
+    def contract_aggregates():
+        """Contracts loaded whole in two queries, whatever is read from them later.
+
+        The first query joins the company, state, NCM, ICMS rate and margin; the
+        second fetches the items of every contract in index order, so
+        ``contract.items.all()`` is already sorted and never hits the database.
+        """
+        return Contract.objects.select_related(
+            "company", "state", "ncm", "icms", "margin"
+        ).prefetch_related(
+            models.Prefetch("items", queryset=ContractItem.objects.order_by("index"))
+        )
+
+    @classmethod
+    def get_contract_by_id(cls, contract_id: uuid.UUID):
+        return cls.contract_aggregates().filter(pk=contract_id).first()
 
     def return_iapp_contract(
         self, contract_id: uuid.UUID, user_email: str, bearer_token: str
     ):
+        deadline = time.monotonic() + self.RETURN_DEADLINE
+
         if not (contract := self.get_contract_by_id(contract_id)):
             raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrado")
 
-        token, secret = self._get_credentials(contract.company)
         payload = self._prepare_update_payload(contract)
-        self._update_contract_data(contract.contract_id, payload, token, secret)
+        company = contract.company
+
+        # The iApp update and the recipient lookup wait on different hosts, so
+        # they run side by side; neither touches the database.
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = {
+                "iapp": executor.submit(
+                    self.iapp_service.update_contract,
+                    company,
+                    contract.contract_id,
+                    payload,
+                ),
+                "recipients": executor.submit(
+                    self.gimix_service.get_margin_admins_email, bearer_token
+                ),
+            }
+            wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        stages = {
+            stage: self._stage_result(future) for stage, future in futures.items()
+        }
+
+        if (iapp := stages["iapp"])["status"] != "ok":
+            status = (
+                HTTPStatus.GATEWAY_TIMEOUT
+                if iapp["status"] == "timeout"
+                else iapp["http_status"]
+            )
+            raise HttpError(
+                status, f"Falha ao atualizar o contrato no iApp: {iapp['detail']}"
+            )
 
-        recipients = self.gimix_service.get_margin_admins_email(bearer_token)
-        recipients.append(user_email)
+        # The contract is already returned; a missing admin list only narrows
+        # who gets the email.
+        recipients = [user_email]
+        if stages["recipients"]["status"] == "ok":
+            recipients = list(
+                dict.fromkeys([*futures["recipients"].result(), user_email])
+            )
 
-        self.email_service.send_margin_email(contract, recipients)
+        try:
+            self.email_service.enqueue_margin_email(contract, recipients)
+            stages["email"] = {"status": "ok", "detail": None}
+        except DatabaseError as exc:
+            stages["email"] = {"status": "failed", "detail": str(exc)}
 
         return {
             "detail": f"Retorno do contrato {contract.contract_number} realizado com sucesso.",
-            "url": f"https://iapp.iniciativaaplicativos.com.br/comercial/contratos/editar?id={contract.contract_id}",
+            "url": contract.iapp_url,
+            "stages": [
+                {
+                    "stage": stage,
+                    "status": result["status"],
+                    "detail": result["detail"],
+                }
+                for stage, result in stages.items()
+            ],
+        }
+
+    def return_iapp_contracts(
+        self, contract_ids: list[uuid.UUID], user_email: str, bearer_token: str
+    ):
+        contract_ids = list(dict.fromkeys(contract_ids))
+
+        if not contract_ids:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum contrato enviado.")
+
+        if len(contract_ids) > self.MAX_BATCH_SIZE:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"O limite de {self.MAX_BATCH_SIZE} contratos por retorno foi atingido.",
+            )
+
+        contracts = self.contract_aggregates().in_bulk(contract_ids)
+        payloads, errors = self._prepare_return_payloads(contract_ids, contracts)
+
+        # iApp credentials are per company, so each company gets its own cap
+        # on simultaneous updates.
+        limits = {
+            company_id: threading.BoundedSemaphore(self.MAX_RETURN_WORKERS_PER_COMPANY)
+            for company_id in {contracts[pk].company_id for pk in payloads}
+        }
+
+        def update_contract(contract: Contract):
+            with limits[contract.company_id]:
+                self.iapp_service.update_contract(
+                    contract.company, contract.contract_id, payloads[contract.pk]
+                )
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.MAX_BATCH_WORKERS, len(payloads)) + 1
+        ) as executor:
+            recipients_future = executor.submit(
+                self.gimix_service.get_margin_admins_email, bearer_token
+            )
+            futures = {
+                pk: executor.submit(update_contract, contracts[pk]) for pk in payloads
+            }
+
+        returned = []
+        for pk, future in futures.items():
+            try:
+                future.result()
+                returned.append(contracts[pk])
+            except HttpError as exc:
+                errors.append(
+                    {
+                        "contract": str(pk),
+                        "status": exc.status_code,
+                        "detail": exc.message,
+                    }
+                )
+
+        stages = self._notify_returned(returned, recipients_future, user_email)
+
+        return {
+            "contracts": [
+                {
+                    "id": contract.id,
+                    "contract_number": contract.contract_number,
+                    "url": contract.iapp_url,
+                }
+                for contract in returned
+            ],
+            "errors": errors,
+            "stages": [
+                {
+                    "stage": stage,
+                    "status": result["status"],
+                    "detail": result["detail"],
+                }
+                for stage, result in stages.items()
+            ],
+        }
+
+    def _prepare_return_payloads(self, contract_ids: list[uuid.UUID], contracts: dict):
+        """Build the iApp payload of each returnable contract, in request order."""
+        errors = []
+        payloads = {}
+        for contract_id in contract_ids:
+            if not (contract := contracts.get(contract_id)):
+                errors.append(
+                    {
+                        "contract": str(contract_id),
+                        "status": HTTPStatus.NOT_FOUND,
+                        "detail": "Contrato não encontrado",
+                    }
+                )
+            elif contract.margin is None:
+                errors.append(
+                    {
+                        "contract": str(contract_id),
+                        "status": HTTPStatus.BAD_REQUEST,
+                        "detail": "Contrato não calculado.",
+                    }
+                )
+            else:
+                payloads[contract_id] = self._prepare_update_payload(contract)
+
+        return payloads, errors
+
+    def _notify_returned(
+        self, returned: list[Contract], recipients_future, user_email: str
+    ) -> dict:
+        """Queue the summary email of a batch return; returns its stages."""
+        stages = {"recipients": self._stage_result(recipients_future)}
+        recipients = [user_email]
+        if stages["recipients"]["status"] == "ok":
+            recipients = list(dict.fromkeys([*recipients_future.result(), user_email]))
+
+        if not returned:
+            stages["email"] = {
+                "status": "skipped",
+                "detail": "Nenhum contrato retornado.",
+            }
+            return stages
+
+        try:
+            self.email_service.enqueue_contracts_email(returned, recipients)
+            stages["email"] = {"status": "ok", "detail": None}
+        except DatabaseError as exc:
+            stages["email"] = {"status": "failed", "detail": str(exc)}
+        return stages
+
+    @staticmethod
+    def _stage_result(future) -> dict:
+        if not future.done():
+            return {"status": "timeout", "detail": "Tempo limite excedido."}
+        if (exc := future.exception()) is None:
+            return {"status": "ok", "detail": None}
+        if isinstance(exc, HttpError):
+            return {
+                "status": "failed",
+                "detail": exc.message,
+                "http_status": exc.status_code,
+            }
+        return {
+            "status": "failed",
+            "detail": str(exc),
+            "http_status": HTTPStatus.INTERNAL_SERVER_ERROR,
         }
 
     def _prepare_update_payload(self, contract: Contract):
@@ -75,57 +329,191 @@ class ContractService:
 
         return response
 
-    def _update_contract_data(self, contract_id, payload, token, secret):
-        ENDPOINT = f"https://api.iniciativaaplicativos.com.br/api/comercial/contratos/atualiza/{contract_id}"
-        headers = {"TOKEN": token, "SECRET": secret}
+    def calculate_iapp_contract(self, contract_id: uuid.UUID, percentage_id: uuid.UUID):
+        if not (contract := self.get_contract_by_id(contract_id)):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrada")
 
-        response = requests.put(ENDPOINT, json=payload, headers=headers, timeout=10)
+        percentage = self.percentage_service.get_percentage(percentage_id)
+        margin = percentage.value
 
-        if response.ok:
-            iapp_response = response.json()
+        self._apply_effective_icms(contract)
+        [sale_price] = self._calculate_sale_prices(contract, [margin])
 
-            if iapp_response.get("success") is False:
-                raise HttpError(HTTPStatus.BAD_REQUEST, iapp_response.get("message"))
+        items = list(contract.items.all())
+        values = pricing.item_values(
+            sale_price, [item.contribution_rate for item in items]
+        )
+        now = timezone.now()
+        for item, value in zip(items, values):
+            item.updated_value = value
+            item.updated_at = now
 
-            return
+        with transaction.atomic():
+            contract.net_cost_with_margin = sale_price
+            contract.margin = percentage
+            contract.save(
+                update_fields=["net_cost_with_margin", "margin", "icms", "updated_at"]
+            )
 
-        raise HttpError(
-            HTTPStatus.INTERNAL_SERVER_ERROR,
-            f"Erro {response.status_code}: Instabilidade no iApp.",
-        )
+            ContractItem.objects.bulk_update(items, ["updated_value", "updated_at"])
 
-    def calculate_iapp_contract(self, contract_id: uuid.UUID, percentage_id: uuid.UUID):
+        return self._prepare_calculated_response(contract, items)
+
+    def simulate_iapp_contract(
+        self, contract_id: uuid.UUID, margins: Optional[list[float]] = None
+    ):
+        """Price the contract for several margins without writing anything.
+
+        Without ``margins`` every configured Percentage is simulated.
+        """
         if not (contract := self.get_contract_by_id(contract_id)):
             raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrada")
 
-        percentage = self.percentage_service.get_percentage(percentage_id)
-        margin = percentage.value
+        if margins:
+            scenarios = [(None, margin) for margin in dict.fromkeys(margins)]
+        else:
+            scenarios = [
+                (percentage.id, percentage.value)
+                for percentage in Percentage.objects.order_by("value")
+            ]
+
+        if len(scenarios) > self.MAX_SIMULATED_MARGINS:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"Máximo de {self.MAX_SIMULATED_MARGINS} margens por simulação.",
+            )
 
-        sale_price = (
-            float(contract.net_cost_without_taxes) + float(contract.freight_value)
-        ) / (
-            1
-            - (float(contract.icms.total_rate) / 100)
-            - (float(contract.other_taxes) / 100)
-            - (float(margin) / 100)
-            - (float(contract.commission) / 100)
+        self._apply_effective_icms(contract)
+        items = list(contract.items.all())
+
+        for _, margin in scenarios:
+            if not 0 <= margin < 100:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Margem inválida: {margin}%.")
+
+        sale_prices = self._calculate_sale_prices(
+            contract, [margin for _, margin in scenarios]
         )
+        contribution_rates = [item.contribution_rate for item in items]
 
-        sale_price = round(sale_price + 0.5)
+        simulations = []
+        for (percentage_id, margin), sale_price in zip(scenarios, sale_prices):
+            values = pricing.item_values(sale_price, contribution_rates)
+            simulations.append(
+                {
+                    "percentage_id": percentage_id,
+                    "margin": margin,
+                    "net_cost_with_margin": sale_price,
+                    "items": [
+                        {
+                            "id": item.id,
+                            "index": item.index,
+                            "name": item.name,
+                            "updated_value": value,
+                        }
+                        for item, value in zip(items, values)
+                    ],
+                }
+            )
 
-        with transaction.atomic():
-            contract.net_cost_with_margin = sale_price
-            contract.margin = percentage
-            contract.save()
+        return {
+            "id": contract.id,
+            "contract_number": contract.contract_number,
+            "net_cost_without_taxes": contract.net_cost_without_taxes,
+            "freight_value": contract.freight_value,
+            "commission": contract.commission,
+            "icms": contract.icms,
+            "other_taxes": contract.other_taxes,
+            "simulations": simulations,
+        }
+
+    def solve_iapp_contract_margins(self, targets: list):
+        """Implied margin of each (contract_id, target_price) pair, without writes."""
+        if not targets:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum contrato informado.")
+
+        if len(targets) > self.MAX_SOLVE_BATCH_SIZE:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"Máximo de {self.MAX_SOLVE_BATCH_SIZE} contratos por requisição.",
+            )
+
+        contracts = Contract.objects.select_related("state", "ncm", "icms").in_bulk(
+            {contract_id for contract_id, _ in targets}
+        )
+        if len(contracts) != len({contract_id for contract_id, _ in targets}):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrada")
 
-            items = contract.items.all()
-            for item in items:
-                item.updated_value = (sale_price * item.contribution_rate) / 100
-                item.save()
+        for contract in contracts.values():
+            self._apply_effective_icms(contract)
 
-        return self._prepare_calculated_response(contract)
+        rows = [contracts[contract_id] for contract_id, _ in targets]
+        try:
+            margins = pricing.implied_margins(
+                [contract.net_cost_without_taxes for contract in rows],
+                [contract.freight_value for contract in rows],
+                [float(contract.icms.total_rate) for contract in rows],
+                [contract.other_taxes for contract in rows],
+                [contract.commission for contract in rows],
+                [target_price for _, target_price in targets],
+            )
+        except pricing.InvalidMarkupError as exc:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"Preço alvo inválido: {targets[exc.index][1]}.",
+            ) from exc
+
+        percentages = list(Percentage.objects.order_by("value"))
+        nearest = [self._nearest_percentage(percentages, margin) for margin in margins]
+        return [
+            {
+                "contract_id": contract_id,
+                "target_price": target_price,
+                "margin": margin,
+                "percentage": percentage,
+            }
+            for (contract_id, target_price), margin, percentage in zip(
+                targets, margins, nearest
+            )
+        ]
 
-    def _prepare_calculated_response(self, contract: Contract):
+    @staticmethod
+    def _nearest_percentage(percentages: list, margin: float):
+        if not percentages:
+            return None
+
+        return min(
+            percentages, key=lambda percentage: abs(float(percentage.value) - margin)
+        )
+
+    @staticmethod
+    def _apply_effective_icms(contract: Contract):
+        # Rates may have been versioned since the contract was fetched.
+        if (
+            icms_entry := reference_cache.get_rate_entry(
+                contract.state.code, contract.ncm.code, contract.delivery_date
+            )
+        ) and icms_entry.rate.id != contract.icms_id:
+            contract.icms = icms_entry.rate
+
+    @staticmethod
+    def _calculate_sale_prices(contract: Contract, margins: list) -> list[int]:
+        count = len(margins)
+        try:
+            return pricing.sale_prices(
+                [contract.net_cost_without_taxes] * count,
+                [contract.freight_value] * count,
+                [float(contract.icms.total_rate)] * count,
+                [contract.other_taxes] * count,
+                [contract.commission] * count,
+                [float(margin) for margin in margins],
+            )
+        except pricing.InvalidMarkupError as exc:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"A margem de {margins[exc.index]}% torna o preço de venda inválido.",
+            ) from exc
+
+    def _prepare_calculated_response(self, contract: Contract, items):
         items_data = [
             {
                 "id": item.id,
@@ -134,7 +522,7 @@ class ContractService:
                 "contribution_rate": item.contribution_rate,
                 "updated_value": item.updated_value,
             }
-            for item in contract.items.all()
+            for item in items
         ]
 
         return {
@@ -157,31 +545,90 @@ class ContractService:
         }
 
     def find_iapp_contract(self, company_id: uuid.UUID, contract: str):
-        company = self.company_service.get_company(company_id)
+        company = self.company_service.get_cached_company(company_id)
 
-        token, secret = self._get_credentials(company)
-        items = self._get_contract_data(contract, token, secret)
+        items = self.iapp_service.get_contract(company, contract)
+        other_taxes = self._calculate_other_taxes(company.profit_type)
 
-        item = items[0]
-        products = self.validate_field(item.get("produtos"), "produtos")
+        contract_data = self._build_contract_data(company, items[0], other_taxes, {})
+        return self._save_contract(contract_data)
 
-        if len(products) == 0:
-            raise HttpError(HTTPStatus.BAD_REQUEST, "Contrato sem produtos.")
+    def find_iapp_contracts(self, company_id: uuid.UUID, contracts: list[str]):
+        contracts = list(dict.fromkeys(contracts))
 
-        ncm_instance = self._validate_ncm(products)
+        if not contracts:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Nenhum contrato enviado.")
 
+        if len(contracts) > self.MAX_BATCH_SIZE:
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                f"O limite de {self.MAX_BATCH_SIZE} contratos por consulta foi atingido.",
+            )
+
+        company = self.company_service.get_cached_company(company_id)
         other_taxes = self._calculate_other_taxes(company.profit_type)
 
-        state = self.validate_field(item.get("cliente").get("estado"), "cliente.estado")
-        if not (state_instance := self.state_service.get_state_by_code(state)):
-            raise HttpError(HTTPStatus.NOT_FOUND, "Estado não encontrado")
+        with ThreadPoolExecutor(
+            max_workers=min(self.MAX_BATCH_WORKERS, len(contracts))
+        ) as executor:
+            futures = {
+                contract: executor.submit(
+                    self.iapp_service.get_contract, company, contract
+                )
+                for contract in contracts
+            }
 
-        if not (
-            icms_instance := self.icms_service.get_rate_by_state_and_ncm(
-                state, ncm_instance.code
-            )
-        ):
-            raise HttpError(HTTPStatus.NOT_FOUND, "Taxa de ICMS não encontrada")
+        references: dict = {}
+        contracts_data = []
+        errors = []
+        for contract, future in futures.items():
+            try:
+                items = future.result()
+                contracts_data.append(
+                    self._build_contract_data(
+                        company, items[0], other_taxes, references
+                    )
+                )
+            except HttpError as exc:
+                errors.append(
+                    {
+                        "contract": contract,
+                        "status": exc.status_code,
+                        "detail": exc.message,
+                    }
+                )
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+                # A body that isn't JSON or is missing fields only fails its contract.
+                errors.append(
+                    {
+                        "contract": contract,
+                        "status": HTTPStatus.INTERNAL_SERVER_ERROR,
+                        "detail": "Resposta inválida do iApp.",
+                    }
+                )
+
+        return {
+            "contracts": self._save_contracts(contracts_data),
+            "errors": errors,
+        }
+
+    def _build_contract_data(self, company, item, other_taxes, references: dict):
+        products = self.validate_field(item.get("produtos"), "produtos")
+
+        if len(products) == 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Contrato sem produtos.")
+
+        state = self.validate_field(item.get("cliente").get("estado"), "cliente.estado")
+        delivery_date = datetime.strptime(
+            self.validate_field(
+                item.get("datas").get("data_previsao_faturamento"),
+                "datas.data_previsao_faturamento",
+            ),
+            "%Y-%m-%d",
+        ).date()
+        state_instance, ncm_instance, icms_instance = self._resolve_references(
+            state, products, references, delivery_date
+        )
 
         net_cost, net_cost_without_taxes = self._calculate_net_costs(item, other_taxes)
 
@@ -200,13 +647,7 @@ class ContractService:
             "construction_name": self.validate_field(
                 item.get("projeto").get("nome"), "projeto.nome"
             ),
-            "delivery_date": datetime.strptime(
-                self.validate_field(
-                    item.get("datas").get("data_previsao_faturamento"),
-                    "datas.data_previsao_faturamento",
-                ),
-                "%Y-%m-%d",
-            ).date(),
+            "delivery_date": delivery_date,
             "net_cost": net_cost,
             "net_cost_without_taxes": net_cost_without_taxes,
             "net_cost_with_margin": None,
@@ -256,40 +697,32 @@ class ContractService:
             ],
         }
 
-        contract_data_with_ids = self._save_contract(contract_data)
-        return contract_data_with_ids
+        return contract_data
 
-    def _get_credentials(self, company):
-        token = str(os.getenv(f"TOKEN_{company.name}"))
-        secret = str(os.getenv(f"SECRET_{company.name}"))
-        if not token or not secret:
-            raise HttpError(HTTPStatus.UNAUTHORIZED, "Credenciais não configuradas.")
-        return token, secret
+    def _resolve_references(self, state, products, references: dict, delivery_date):
+        ncm = self._validate_ncm(products)
 
-    def _get_contract_data(self, contract, token, secret):
-        ENDPOINT = (
-            "https://api.iniciativaaplicativos.com.br/api/comercial/contratos/lista"
-        )
-        headers = {"TOKEN": token, "SECRET": secret}
-
-        params = {"offset": 1, "page": 1, "filters": f"identificacao|{contract}"}
+        if (state, ncm, delivery_date) not in references:
+            if not (state_instance := self.state_service.get_state_by_code(state)):
+                raise HttpError(HTTPStatus.NOT_FOUND, "Estado não encontrado")
 
-        response = requests.get(ENDPOINT, params=params, headers=headers)
+            if not (ncm_instance := self.ncm_service.get_ncm_by_code(ncm)):
+                raise HttpError(HTTPStatus.NOT_FOUND, "NCM não encontrado")
 
-        if response.ok:
-            iapp_response = response.json()
+            if not (
+                icms_instance := self.icms_service.get_rate_by_state_and_ncm(
+                    state, ncm_instance.code, delivery_date
+                )
+            ):
+                raise HttpError(HTTPStatus.NOT_FOUND, "Taxa de ICMS não encontrada")
 
-            if iapp_response.get("success") is False:
-                raise HttpError(HTTPStatus.BAD_REQUEST, iapp_response.get("message"))
+            references[(state, ncm, delivery_date)] = (
+                state_instance,
+                ncm_instance,
+                icms_instance,
+            )
 
-            if items := iapp_response.get("response"):
-                return items
-            raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrado.")
-
-        raise HttpError(
-            HTTPStatus.INTERNAL_SERVER_ERROR,
-            f"Erro {response.status_code}: Instabilidade no iApp.",
-        )
+        return references[(state, ncm, delivery_date)]
 
     def _validate_ncm(self, products):
         ncm_values = {product.get("produto").get("ncm") for product in products}
@@ -300,18 +733,10 @@ class ContractService:
                 "Todos os produtos devem ter o mesmo NCM.",
             )
 
-        ncm = next(iter(ncm_values))
-        if not (ncm_instance := self.ncm_service.get_ncm_by_code(ncm)):
-            raise HttpError(HTTPStatus.NOT_FOUND, "NCM não encontrado")
-
-        return ncm_instance
+        return next(iter(ncm_values))
 
     def _calculate_other_taxes(self, company_type):
-        return (
-            Tax.total_real_profit_rate()
-            if company_type == "real"
-            else Tax.total_presumed_profit_rate()
-        )
+        return reference_cache.get_tax_total(company_type)
 
     def _calculate_net_costs(self, item, other_taxes):
         products = item.get("produtos")
@@ -328,51 +753,109 @@ class ContractService:
         return net_cost, net_cost_without_taxes
 
     def _save_contract(self, contract_data):
+        return self._save_contracts([contract_data])[0]
+
+    def _save_contracts(self, contracts_data):
         try:
             with transaction.atomic():
-                contract = Contract.objects.create(
-                    contract_id=contract_data["contract_id"],
-                    contract_number=contract_data["contract_number"],
-                    company=contract_data["company"],
-                    client_name=contract_data["client_name"],
-                    client_id=contract_data["client_id"],
-                    construction_name=contract_data["construction_name"],
-                    delivery_date=contract_data["delivery_date"],
-                    net_cost=contract_data["net_cost"],
-                    net_cost_without_taxes=contract_data["net_cost_without_taxes"],
-                    net_cost_with_margin=contract_data["net_cost_with_margin"],
-                    freight_value=contract_data["freight_value"],
-                    commission=contract_data["commission"],
-                    state=contract_data["state"],
-                    ncm=contract_data["ncm"],
-                    icms=contract_data["icms"],
-                    other_taxes=contract_data["other_taxes"],
-                    account=contract_data["account"],
-                    installments=contract_data["installments"],
-                    xped=contract_data["xped"],
-                    margin=contract_data["margin"],
-                )
-                contract_data["id"] = contract.id
-
-                for index, item in enumerate(contract_data["items"]):
-                    item_instance = ContractItem.objects.create(
-                        contract=contract,
-                        index=item["index"],
-                        name=item["name"],
-                        contribution_rate=item["contribution_rate"],
-                        sale_item_id=item["sale_item_id"],
-                        quantity=item["quantity"],
-                        product_id=item["product_id"],
-                        updated_value=item["updated_value"],
-                    )
-                    contract_data["items"][index]["id"] = item_instance.id
+                for contract_data in contracts_data:
+                    self._persist_contract(contract_data)
 
-            return contract_data
+            return contracts_data
         except Exception as e:
             raise HttpError(
                 HTTPStatus.INTERNAL_SERVER_ERROR, f"Erro ao salvar contrato: {e}."
             ) from e
 
+    @staticmethod
+    def _hash_contract_data(contract_data) -> str:
+        normalized = {
+            field: getattr(value, "pk", value)
+            for field, value in contract_data.items()
+            if field not in ("id", "items")
+        }
+        normalized["items"] = [
+            {field: item[field] for field in ContractService.ITEM_FIELDS}
+            for item in contract_data["items"]
+        ]
+        encoded = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def _persist_contract(self, contract_data):
+        payload_hash = self._hash_contract_data(contract_data)
+        contract = (
+            self.contract_aggregates()
+            .filter(
+                company=contract_data["company"],
+                contract_id=contract_data["contract_id"],
+            )
+            .order_by("-updated_at")
+            .first()
+        )
+
+        if contract is None:
+            contract = Contract.objects.create(
+                payload_hash=payload_hash,
+                **{field: contract_data[field] for field in self.CONTRACT_FIELDS},
+            )
+            existing_items = {}
+        elif contract.payload_hash != payload_hash:
+            for field in self.CONTRACT_FIELDS:
+                setattr(contract, field, contract_data[field])
+            contract.payload_hash = payload_hash
+            contract.save()
+            existing_items = {item.sale_item_id: item for item in contract.items.all()}
+        else:
+            contract_data["id"] = contract.id
+            item_ids = {item.sale_item_id: item.id for item in contract.items.all()}
+            for item in contract_data["items"]:
+                item["id"] = item_ids[item["sale_item_id"]]
+            return
+
+        contract_data["id"] = contract.id
+        self._persist_contract_items(contract, contract_data["items"], existing_items)
+
+    def _persist_contract_items(self, contract, items, existing_items):
+        items_to_create = []
+        items_to_update = []
+        updated_fields = set()
+        now = timezone.now()
+
+        for item in items:
+            item_instance = existing_items.pop(item["sale_item_id"], None)
+
+            if item_instance is None:
+                item_instance = ContractItem(
+                    contract=contract,
+                    **{field: item[field] for field in self.ITEM_FIELDS},
+                )
+                items_to_create.append(item_instance)
+            elif changed_fields := [
+                field
+                for field in self.ITEM_FIELDS
+                if getattr(item_instance, field) != item[field]
+            ]:
+                for field in changed_fields:
+                    setattr(item_instance, field, item[field])
+                item_instance.updated_at = now
+                updated_fields.update(changed_fields)
+                items_to_update.append(item_instance)
+
+            item["id"] = item_instance.id
+
+        if items_to_create:
+            ContractItem.objects.bulk_create(items_to_create)
+
+        if items_to_update:
+            ContractItem.objects.bulk_update(
+                items_to_update, [*sorted(updated_fields), "updated_at"]
+            )
+
+        if existing_items:
+            ContractItem.objects.filter(
+                id__in=[item.id for item in existing_items.values()]
+            ).delete()
+
     def raise_error(self, field):
         raise HttpError(
             HTTPStatus.BAD_REQUEST, f"Campo obrigatório ausente no iApp: '{field}'."
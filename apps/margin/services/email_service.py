@@ -1,129 +1,153 @@
-from http import HTTPStatus
+import random
+from contextlib import suppress
+from datetime import timedelta
+from operator import attrgetter
+from typing import Optional
 
-from babel.numbers import format_currency, format_percent
 from django.conf import settings
-from django.core.mail import send_mail
-from ninja.errors import HttpError
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
 
-from apps.margin.models import Contract
+from apps.margin.models import Contract, EmailOutbox
 
 
 class EmailService:
+    """Margin emails go through the EmailOutbox table.
+
+    Requests only enqueue; the ``send_outbox_emails`` worker delivers the
+    queue over one SMTP connection and retries failures with exponential
+    backoff and jitter.
+    """
+
+    BATCH_SIZE = 50
+    MAX_ATTEMPTS = 6
+    BACKOFF_BASE = timedelta(seconds=30)
+    BACKOFF_MAX = timedelta(hours=1)
+    LEASE = timedelta(minutes=5)
+
+    def enqueue_margin_email(self, contract: Contract, recipients: list[str]):
+        return self._enqueue(*self.build_margin_email(contract), recipients)
+
+    def enqueue_contracts_email(self, contracts: list[Contract], recipients: list[str]):
+        return self._enqueue(*self.build_contracts_email(contracts), recipients)
+
+    @staticmethod
+    def _enqueue(subject: str, body: str, html_body: str, recipients: list[str]):
+        return EmailOutbox.objects.create(
+            subject=subject,
+            body=body,
+            html_body=html_body,
+            from_email=settings.EMAIL_HOST_USER,
+            recipients=recipients,
+        )
+
+    @staticmethod
+    def build_margin_email(contract: Contract, items=None):
+        """Subject, plain-text and HTML bodies of the contract return email."""
+        if items is None:
+            # Already ordered when the contract comes from contract_aggregates().
+            items = sorted(contract.items.all(), key=attrgetter("index"))
+        context = {"contract": contract, "items": items}
+        subject = (
+            f"App Margem - Retorno do Contrato {contract.contract_number} "
+            f"({contract.company})"
+        )
+        return (
+            subject,
+            render_to_string("margin/email/contract_returned.txt", context),
+            render_to_string("margin/email/contract_returned.html", context),
+        )
+
     @staticmethod
-    def send_margin_email(contract: Contract, recipients: list[str]):
-        email_from = settings.EMAIL_HOST_USER
-        email_subject = f"App Margem - Retorno do Contrato {contract.contract_number} ({contract.company})"
-        email_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                }}
-                h3, h2 {{
-                    color: #333;
-                }}
-                ul {{
-                    list-style-type: none;
-                    padding: 0;
-                }}
-                ul li {{
-                    margin-bottom: 10px;
-                }}
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin-top: 20px;
-                }}
-                table, th, td {{
-                    border: 1px solid #ddd;
-                }}
-                th, td {{
-                    padding: 8px;
-                    text-align: left;
-                }}
-                th {{
-                    background-color: #f2f2f2;
-                }}
-                .button {{
-                    display: inline-block;
-                    background-color: #f0f0f0;
-                    padding: 8px 16px;
-                    text-align: center;
-                    text-decoration: none;
-                    font-size: 16px;
-                    border-radius: 10px;
-                    margin-top: 10px;
-                    border: 2px solid black;
-                    font-weight: bold;
-                    transition: background-color 0.2s ease;
-                }}
-                .button:hover {{
-                    background-color: #e0e0e0;
-                }}
-            </style>
-        </head>
-        <body>
-            <h2>🎉 Contrato retornado com sucesso.</h2>
-            <h3>Detalhes do contrato:</h3>
-            <ul>
-                <li><strong>Número:</strong> {contract.contract_number}</li>
-                <li><strong>Empresa:</strong> {contract.company}</li>
-                <li><strong>Cliente:</strong> {contract.client_name}</li>
-                <li><strong>Obra:</strong> {contract.construction_name}</li>
-                <li><strong>Estado:</strong> {contract.state.name}</li>
-                <li><strong>NCM:</strong> {contract.ncm.code}</li>
-                <li><strong>Frete:</strong> {format_currency(contract.freight_value, "BRL", locale="pt_BR")}</li>
-                <li><strong>Comissão:</strong> {format_percent(contract.commission / 100, format="0.00%", locale="pt_BR")}</li>
-                <li><strong>ICMS:</strong> {format_percent(contract.icms.total_rate / 100, format="0.00%", locale="pt_BR")}</li>
-                <li><strong>Outros impostos:</strong> {format_percent(contract.other_taxes / 100, format="0.00%", locale="pt_BR")}</li>
-                <li><strong>Margem:</strong> {format_percent(contract.margin.value / 100, format="0.00%", locale="pt_BR")}</li>
-                <li><strong>Custo líquido:</strong> {format_currency(contract.net_cost, "BRL", locale="pt_BR")}</li>
-                <li><strong>Custo líquido sem impostos:</strong> {format_currency(contract.net_cost_without_taxes, "BRL", locale="pt_BR")}</li>
-                <li><strong>Custo atualizado</strong> {format_currency(contract.net_cost_with_margin, "BRL", locale="pt_BR")}</li>
-            </ul>
-            <a href="https://iapp.iniciativaaplicativos.com.br/comercial/contratos/editar?id={contract.contract_id}" class="button">Ver Contrato</a>
-            <h3>Itens do contrato:</h3>
-            <table>
-                <thead>
-                    <tr>
-                        <th>Item</th>
-                        <th>Nome</th>
-                        <th>Contribuição</th>
-                        <th>Valor Unitário</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-
-        for item in contract.items.all():
-            email_body += f"""
-                    <tr>
-                        <td>{item.index}</td>
-                        <td>{item.name}</td>
-                        <td>{format_percent(item.contribution_rate / 100, format="0.00%", locale="pt_BR")}</td>
-                        <td>{format_currency(item.updated_value, "BRL", locale="pt_BR")}</td>
-                    </tr>
-            """
-
-        email_body += """
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
+    def build_contracts_email(contracts: list[Contract]):
+        """One summary email for the contracts of a batch return."""
+        context = {"contracts": contracts}
+        subject = f"App Margem - Retorno de {len(contracts)} contratos"
+        return (
+            subject,
+            render_to_string("margin/email/contracts_returned.txt", context),
+            render_to_string("margin/email/contracts_returned.html", context),
+        )
 
+    def claim_due_emails(self, batch_size: Optional[int] = None):
+        """Lease due messages so concurrent workers never send the same one."""
+        now = timezone.now()
+        with transaction.atomic():
+            emails = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status__in=["pending", "sending"], next_attempt_at__lte=now)
+                .order_by("next_attempt_at")[: batch_size or self.BATCH_SIZE]
+            )
+            EmailOutbox.objects.filter(pk__in=[email.pk for email in emails]).update(
+                status="sending", next_attempt_at=now + self.LEASE, updated_at=now
+            )
+        return emails
+
+    def send_outbox(self, batch_size: Optional[int] = None, connection=None):
+        """Send one batch of due messages; returns the sent and retried counts."""
+        result = {"sent": 0, "retried": 0}
+        if not (emails := self.claim_due_emails(batch_size)):
+            return result
+
+        connection = connection or get_connection()
         try:
-            send_mail(
-                subject=email_subject,
-                message=email_subject,
-                from_email=email_from,
-                recipient_list=recipients,
-                html_message=email_body,
-                fail_silently=False,
+            for email in emails:
+                try:
+                    # Opens the connection, or reopens it after a failure closed it.
+                    # When SMTP is down this fails and the message is retried.
+                    connection.open()
+                    self._deliver(email, connection)
+                except Exception as exc:
+                    self._schedule_retry(email, exc)
+                    result["retried"] += 1
+                    # A broken connection fails every later message as well.
+                    with suppress(Exception):
+                        connection.close()
+                else:
+                    result["sent"] += 1
+        finally:
+            with suppress(Exception):
+                connection.close()
+
+        return result
+
+    @staticmethod
+    def _deliver(email: EmailOutbox, connection):
+        message = EmailMultiAlternatives(
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email,
+            to=email.recipients,
+            connection=connection,
+        )
+        if email.html_body:
+            message.attach_alternative(email.html_body, "text/html")
+        message.send(fail_silently=False)
+
+        email.status = "sent"
+        email.sent_at = timezone.now()
+        email.attempts += 1
+        email.save(update_fields=["status", "sent_at", "attempts", "updated_at"])
+
+    def _schedule_retry(self, email: EmailOutbox, error: Exception):
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= self.MAX_ATTEMPTS:
+            email.status = "failed"
+        else:
+            backoff = min(
+                self.BACKOFF_BASE * 2 ** (email.attempts - 1), self.BACKOFF_MAX
             )
-        except Exception as e:
-            raise HttpError(
-                HTTPStatus.INTERNAL_SERVER_ERROR, f"Erro ao enviar e-mail: {str(e)}"
-            ) from e
+            email.status = "pending"
+            email.next_attempt_at = timezone.now() + backoff * random.uniform(0.5, 1)
+        email.save(
+            update_fields=[
+                "attempts",
+                "last_error",
+                "status",
+                "next_attempt_at",
+                "updated_at",
+            ]
+        )
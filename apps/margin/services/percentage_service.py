@@ -1,10 +1,12 @@
 import uuid
 from http import HTTPStatus
+from typing import Optional
 from django.db import IntegrityError
 from ninja.errors import HttpError
 
 from apps.margin.models import Percentage
 from apps.margin.schema import PercentageUpdateSchema
+from utils.pagination import DEFAULT_LIMIT, paginate
 from utils.validation import ValidationService
 
 
@@ -17,14 +19,14 @@ class PercentageService:
         return Percentage.objects.filter(pk=percentage_id).first()
 
     @staticmethod
-    def list_percentages():
-        percentages = Percentage.objects.all().order_by("id")
-        count = percentages.count()
-
-        return {
-            "count": count,
-            "percentages": percentages,
-        }
+    def list_percentages(
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        return paginate(
+            Percentage.objects.all(), ("value", "id"), cursor, limit, with_count
+        ).as_dict("percentages")
 
     def get_percentage(self, percentage_id: uuid.UUID):
         if not (percentage := self.get_percentage_by_id(percentage_id)):
@@ -0,0 +1,268 @@
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Optional
+
+from django.db import connections, models
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from apps.margin import pricing
+from apps.margin.models import Contract, ContractItem, RepricingJob
+from utils.reference_cache import reference_cache
+
+
+class RepricingService:
+    """Reprice stored contracts after the reference data behind them changed.
+
+    The affected contracts are split into primary key ranges of ``chunk_size``.
+    Each range is priced in memory with the pricing kernel and written back
+    with two UPDATE statements, one for the contracts and one for their items,
+    so the number of queries grows with the number of chunks, not of rows.
+    ``job.cursor`` holds the last key of the completed prefix of ranges; a job
+    that is run again resumes after it. Repricing a range twice is harmless.
+    A running job holds a lease renewed after every range; once its heartbeat
+    is older than ``HEARTBEAT_TIMEOUT`` the worker is presumed dead and the job
+    can be resumed.
+    """
+
+    CHUNK_SIZE = 500
+    HEARTBEAT_TIMEOUT = timedelta(minutes=10)
+    PROGRESS_FIELDS = [
+        "status",
+        "total",
+        "processed",
+        "failed",
+        "cursor",
+        "error",
+        "started_at",
+        "finished_at",
+        "heartbeat_at",
+        "updated_at",
+    ]
+
+    @staticmethod
+    def create_job(
+        reason: str = "",
+        state_groups: Optional[list[tuple[uuid.UUID, uuid.UUID]]] = None,
+        percentages: Optional[list[uuid.UUID]] = None,
+    ) -> RepricingJob:
+        scope = {}
+        if state_groups:
+            scope["state_groups"] = [
+                [str(state_id), str(group_id)] for state_id, group_id in state_groups
+            ]
+        if percentages:
+            scope["percentages"] = [str(percentage) for percentage in percentages]
+        return RepricingJob.objects.create(reason=reason, scope=scope)
+
+    @classmethod
+    def resumable_jobs(cls):
+        """Unfinished jobs, leaving out running ones whose worker is still alive."""
+        stale = timezone.now() - cls.HEARTBEAT_TIMEOUT
+        return RepricingJob.objects.exclude(status="completed").exclude(
+            status="running", heartbeat_at__gte=stale
+        )
+
+    @staticmethod
+    def affected_contracts(job: RepricingJob):
+        contracts = Contract.objects.filter(margin__isnull=False)
+        if not job.scope:
+            return contracts
+
+        scope = models.Q(pk__in=[])
+        for state_id, group_id in job.scope.get("state_groups", []):
+            scope |= models.Q(state_id=state_id, ncm__group_id=group_id)
+        if percentages := job.scope.get("percentages"):
+            scope |= models.Q(margin_id__in=percentages)
+        return contracts.filter(scope)
+
+    def run(
+        self,
+        job_id: uuid.UUID,
+        workers: int = 1,
+        chunk_size: Optional[int] = None,
+        progress=None,
+    ):
+        job = RepricingJob.objects.get(pk=job_id)
+        if job.status == "completed":
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Reprecificação já concluída.")
+
+        # Take the lease in one UPDATE so two workers can't both start the job.
+        now = timezone.now()
+        if not (
+            self.resumable_jobs()
+            .filter(pk=job.pk)
+            .update(status="running", heartbeat_at=now, updated_at=now)
+        ):
+            raise HttpError(HTTPStatus.CONFLICT, "Reprecificação já em andamento.")
+
+        contracts = self.affected_contracts(job)
+        if job.cursor is None:
+            job.total = contracts.count()
+            job.processed = job.failed = 0
+            job.started_at = timezone.now()
+        else:
+            contracts = contracts.filter(pk__gt=job.cursor)
+
+        job.status = "running"
+        job.error = ""
+        job.heartbeat_at = now
+        job.save(update_fields=self.PROGRESS_FIELDS)
+
+        keys = list(contracts.order_by("pk").values_list("pk", flat=True))
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        ranges = [
+            (str(job.pk), str(chunk[0]), str(chunk[-1]))
+            for chunk in (
+                keys[start : start + chunk_size]
+                for start in range(0, len(keys), chunk_size)
+            )
+        ]
+
+        try:
+            for (_, _, last_key), (processed, failed) in zip(
+                ranges, self._map_ranges(ranges, workers)
+            ):
+                job.cursor = last_key
+                job.processed += processed
+                job.failed += failed
+                job.heartbeat_at = timezone.now()
+                job.save(update_fields=self.PROGRESS_FIELDS)
+                if progress:
+                    progress(job)
+        except Exception as exc:
+            job.status = "failed"
+            job.error = str(exc)
+            job.save(update_fields=self.PROGRESS_FIELDS)
+            raise
+        except BaseException:
+            # Stopped on purpose (Ctrl-C): release the lease so it can resume now.
+            job.heartbeat_at = None
+            job.save(update_fields=self.PROGRESS_FIELDS)
+            raise
+
+        job.status = "completed"
+        job.finished_at = timezone.now()
+        job.save(update_fields=self.PROGRESS_FIELDS)
+        return job
+
+    def start_in_background(self, job: RepricingJob):
+        def target():
+            try:
+                self.run(job.pk)
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=target, daemon=True).start()
+
+    @staticmethod
+    def _map_ranges(ranges, workers: int):
+        if workers <= 1 or len(ranges) <= 1:
+            yield from map(_reprice_range, ranges)
+            return
+
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            yield from executor.map(_reprice_range, ranges)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def reprice_range(self, job_id: str, first_key: str, last_key: str):
+        job = RepricingJob.objects.get(pk=job_id)
+        rows = list(
+            self.affected_contracts(job)
+            .filter(pk__gte=first_key, pk__lte=last_key)
+            .values(
+                "pk",
+                "net_cost",
+                "freight_value",
+                "commission",
+                "delivery_date",
+                "icms_id",
+                "state__code",
+                "ncm__code",
+                "icms__total_rate",
+                "margin__value",
+                "company__profit_type",
+            )
+        )
+
+        for row in rows:
+            entry = reference_cache.get_rate_entry(
+                row["state__code"], row["ncm__code"], row["delivery_date"]
+            )
+            if entry is not None:
+                row["icms_id"] = entry.rate.id
+                row["icms__total_rate"] = entry.total_rate
+            row["other_taxes"] = float(
+                reference_cache.get_tax_total(row["company__profit_type"])
+            )
+            row["net_cost_without_taxes"] = row["net_cost"] / (
+                1 + row["other_taxes"] / 100
+            )
+
+        failed = 0
+        while True:
+            try:
+                prices = pricing.sale_prices(
+                    [row["net_cost_without_taxes"] for row in rows],
+                    [row["freight_value"] for row in rows],
+                    [float(row["icms__total_rate"]) for row in rows],
+                    [row["other_taxes"] for row in rows],
+                    [row["commission"] for row in rows],
+                    [float(row["margin__value"]) for row in rows],
+                )
+                break
+            except pricing.InvalidMarkupError as exc:
+                rows.pop(exc.index)
+                failed += 1
+
+        if rows:
+            self._write_prices(rows, prices)
+        return len(rows), failed
+
+    @staticmethod
+    def _write_prices(rows, prices):
+        def by_contract(field, values, output_field):
+            return models.Case(
+                *(
+                    models.When(**{field: row["pk"]}, then=models.Value(value))
+                    for row, value in zip(rows, values)
+                ),
+                output_field=output_field,
+            )
+
+        keys = [row["pk"] for row in rows]
+        now = timezone.now()
+        Contract.objects.filter(pk__in=keys).update(
+            net_cost_with_margin=by_contract("pk", prices, models.FloatField()),
+            net_cost_without_taxes=by_contract(
+                "pk",
+                [row["net_cost_without_taxes"] for row in rows],
+                models.FloatField(),
+            ),
+            other_taxes=by_contract(
+                "pk", [row["other_taxes"] for row in rows], models.FloatField()
+            ),
+            icms_id=by_contract(
+                "pk", [row["icms_id"] for row in rows], models.UUIDField()
+            ),
+            updated_at=now,
+        )
+        # Same share formula as pricing.item_values, evaluated by the database.
+        ContractItem.objects.filter(contract_id__in=keys).update(
+            updated_value=models.F("contribution_rate")
+            * by_contract(
+                "contract_id", [price / 100 for price in prices], models.FloatField()
+            ),
+            updated_at=now,
+        )
+
+
+def _reprice_range(chunk):
+    return RepricingService().reprice_range(*chunk)
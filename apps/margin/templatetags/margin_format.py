@@ -0,0 +1,15 @@
+from django import template
+
+from utils.formatters import format_brl, format_rate
+
+register = template.Library()
+
+
+@register.filter
+def brl(value):
+    return "-" if value is None else format_brl(value)
+
+
+@register.filter
+def rate(value):
+    return "-" if value is None else format_rate(value)
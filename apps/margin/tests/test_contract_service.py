@@ -0,0 +1,465 @@
+import time
+from datetime import date
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ninja.errors import HttpError
+
+from apps.icms.models import NCM, ICMSRate, NCMGroup, State
+from apps.margin.models import (
+    Company,
+    Contract,
+    ContractItem,
+    EmailOutbox,
+    Percentage,
+)
+from apps.margin.services.contract_service import ContractService
+from apps.taxes.models import Tax
+from utils.reference_cache import reference_cache
+
+
+def iapp_contract(contract_id=1, number="C-1", state="PR", ncm="8504.40.90"):
+    return {
+        "id": contract_id,
+        "identificacao": number,
+        "cliente": {"id": 10, "nome": "Client", "estado": state},
+        "projeto": {"nome": "Construction"},
+        "datas": {"data_previsao_faturamento": "2025-01-31"},
+        "valores": {"valor_frete": 100.0, "valor_produtos_sem_icms": 1000.0},
+        "vendedor": {"nome": "Gimi_2,5%"},
+        "conta_corrente": 1,
+        "parcelamento": 2,
+        "xped": None,
+        "produtos": [
+            {
+                "id": 100 + index,
+                "qtde": 1,
+                "produto": {"id": 200 + index, "ncm": ncm},
+                "tags": {"produto": f"Product {index}"},
+                "valores": {"valor_produtos_sem_icms": 500.0},
+            }
+            for index in range(2)
+        ],
+    }
+
+
+@pytest.fixture
+def contract_service():
+    return ContractService()
+
+
+@pytest.fixture
+def company():
+    state = State.objects.create(name="Paraná", code="PR")
+    group = NCMGroup.objects.create(name="Group 1")
+    NCM.objects.create(code="8504.40.90", group=group)
+    ICMSRate.objects.create(
+        state=state,
+        group=group,
+        internal_rate=12.0,
+        difal_rate=6.0,
+        poverty_rate=0,
+        valid_from=date(2024, 1, 1),
+    )
+    Tax.objects.create(name="PIS", presumed_profit_rate=0.65, real_profit_rate=1.65)
+    return Company.objects.create(name="GIMI", profit_type="real")
+
+
+@pytest.mark.django_db
+def test_find_iapp_contract(contract_service, company, mocker):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    assert contract["contract_number"] == "C-1"
+    assert contract["commission"] == 2.5
+    assert Contract.objects.count() == 1
+    assert ContractItem.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_find_iapp_contracts_reports_errors(contract_service, company, mocker):
+    def get_contract(_, contract):
+        if contract == "C-2":
+            raise HttpError(404, "Contrato não encontrado.")
+        return [iapp_contract(contract_id=int(contract[2:]), number=contract)]
+
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", side_effect=get_contract
+    )
+    result = contract_service.find_iapp_contracts(company.id, ["C-1", "C-2", "C-3"])
+    assert [c["contract_number"] for c in result["contracts"]] == ["C-1", "C-3"]
+    assert result["errors"] == [
+        {"contract": "C-2", "status": 404, "detail": "Contrato não encontrado."}
+    ]
+    assert Contract.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_find_iapp_contracts_reports_malformed_responses(
+    contract_service, company, mocker
+):
+    def get_contract(_, contract):
+        if contract == "C-2":
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        if contract == "C-3":
+            return [{**iapp_contract(contract_id=3, number=contract), "cliente": None}]
+        return [iapp_contract(contract_id=int(contract[2:]), number=contract)]
+
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", side_effect=get_contract
+    )
+    result = contract_service.find_iapp_contracts(company.id, ["C-1", "C-2", "C-3"])
+    assert [c["contract_number"] for c in result["contracts"]] == ["C-1"]
+    assert result["errors"] == [
+        {"contract": "C-2", "status": 500, "detail": "Resposta inválida do iApp."},
+        {"contract": "C-3", "status": 500, "detail": "Resposta inválida do iApp."},
+    ]
+
+
+@pytest.mark.django_db
+def test_find_iapp_contract_is_idempotent(contract_service, company, mocker):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    first = contract_service.find_iapp_contract(company.id, "C-1")
+    second = contract_service.find_iapp_contract(company.id, "C-1")
+    assert first["id"] == second["id"]
+    assert [item["id"] for item in first["items"]] == [
+        item["id"] for item in second["items"]
+    ]
+    assert Contract.objects.count() == 1
+    assert ContractItem.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_find_iapp_contract_diffs_items(contract_service, company, mocker):
+    data = iapp_contract()
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[data]
+    )
+    first = contract_service.find_iapp_contract(company.id, "C-1")
+
+    data["produtos"] = data["produtos"][:1]
+    data["produtos"][0]["qtde"] = 3
+    second = contract_service.find_iapp_contract(company.id, "C-1")
+
+    assert second["id"] == first["id"]
+    assert second["items"][0]["id"] == first["items"][0]["id"]
+    item = ContractItem.objects.get()
+    assert item.quantity == 3
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+def count_contract_write_queries(contract_service, company, percentage, products):
+    data = iapp_contract(contract_id=products, number=f"C-{products}")
+    data["produtos"] = [
+        {**data["produtos"][0], "id": 100 + index} for index in range(products)
+    ]
+    contract_service.iapp_service.get_contract.return_value = [data]
+
+    contract = {}
+    find_queries = count_queries(
+        lambda: contract.update(
+            contract_service.find_iapp_contract(company.id, data["identificacao"])
+        )
+    )
+    calculate_queries = count_queries(
+        lambda: contract_service.calculate_iapp_contract(contract["id"], percentage.id)
+    )
+    return_queries = count_queries(
+        lambda: contract_service.return_iapp_contract(
+            contract["id"], "user@gimi.com.br", "token"
+        )
+    )
+    return find_queries, calculate_queries, return_queries
+
+
+@pytest.mark.django_db
+def test_contract_writes_use_constant_queries(contract_service, company, mocker):
+    percentage = Percentage.objects.create(value=10.0)
+    mocker.patch.object(contract_service.iapp_service, "get_contract")
+    mocker.patch.object(contract_service.iapp_service, "update_contract")
+    mocker.patch.object(
+        contract_service.gimix_service, "get_margin_admins_email", return_value=[]
+    )
+    reference_cache.snapshot()
+
+    small = count_contract_write_queries(contract_service, company, percentage, 2)
+    large = count_contract_write_queries(contract_service, company, percentage, 80)
+
+    assert small == large
+    assert ContractItem.objects.filter(updated_value__isnull=False).count() == 82
+
+
+@pytest.mark.django_db
+def test_contract_uses_rate_effective_at_delivery_date(
+    contract_service, company, mocker
+):
+    rate = ICMSRate.objects.get()
+    ICMSRate.objects.create(
+        state=rate.state,
+        group=rate.group,
+        internal_rate=19.0,
+        difal_rate=0,
+        poverty_rate=0,
+        valid_from=date(2025, 2, 1),
+    )
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    assert contract["icms"].id == rate.id
+
+    preloaded = ICMSRate.objects.create(
+        state=rate.state,
+        group=rate.group,
+        internal_rate=17.0,
+        difal_rate=0,
+        poverty_rate=0,
+        valid_from=date(2025, 1, 15),
+    )
+    percentage = Percentage.objects.create(value=10.0)
+    calculated = contract_service.calculate_iapp_contract(contract["id"], percentage.id)
+    assert calculated["icms"].id == preloaded.id
+
+
+@pytest.mark.django_db
+def test_simulate_iapp_contract_does_not_write(contract_service, company, mocker):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    for value in (10.0, 15.0):
+        Percentage.objects.create(value=value)
+
+    with CaptureQueriesContext(connection) as queries:
+        result = contract_service.simulate_iapp_contract(contract["id"])
+
+    assert not [query for query in queries if not query["sql"].startswith("SELECT")]
+    assert [simulation["margin"] for simulation in result["simulations"]] == [10, 15]
+    calculated = contract_service.calculate_iapp_contract(
+        contract["id"], Percentage.objects.get(value=15.0).id
+    )
+    simulated = result["simulations"][1]
+    assert simulated["net_cost_with_margin"] == calculated["net_cost_with_margin"]
+    assert [item["updated_value"] for item in simulated["items"]] == [
+        item["updated_value"] for item in calculated["items"]
+    ]
+
+    with pytest.raises(HttpError):
+        contract_service.simulate_iapp_contract(contract["id"], [80.0])
+
+
+@pytest.mark.django_db
+def test_solve_iapp_contract_margins_inverts_calculation(
+    contract_service, company, mocker
+):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    percentages = [Percentage.objects.create(value=value) for value in (10.0, 15.0)]
+    calculated = contract_service.calculate_iapp_contract(
+        contract["id"], percentages[1].id
+    )
+
+    [solution] = contract_service.solve_iapp_contract_margins(
+        [(contract["id"], calculated["net_cost_with_margin"])]
+    )
+
+    assert solution["margin"] == pytest.approx(15.0, abs=0.1)
+    assert solution["percentage"] == percentages[1]
+
+    with pytest.raises(HttpError):
+        contract_service.solve_iapp_contract_margins([(contract["id"], 0)])
+
+
+@pytest.mark.django_db
+def test_return_iapp_contract_enqueues_email(contract_service, company, mocker):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    update_contract = mocker.patch.object(
+        contract_service.iapp_service, "update_contract"
+    )
+    mocker.patch.object(
+        contract_service.gimix_service,
+        "get_margin_admins_email",
+        return_value=["admin@gimi.com.br"],
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    percentage = Percentage.objects.create(value=10.0)
+    contract_service.calculate_iapp_contract(contract["id"], percentage.id)
+
+    result = contract_service.return_iapp_contract(
+        contract["id"], "user@gimi.com.br", "token"
+    )
+
+    update_contract.assert_called_once()
+    assert [stage["status"] for stage in result["stages"]] == ["ok", "ok", "ok"]
+    email = EmailOutbox.objects.get()
+    assert email.status == "pending"
+    assert email.recipients == ["admin@gimi.com.br", "user@gimi.com.br"]
+    assert "C-1" in email.subject
+
+
+def calculated_contract(contract_service, company, mocker):
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", return_value=[iapp_contract()]
+    )
+    contract = contract_service.find_iapp_contract(company.id, "C-1")
+    percentage = Percentage.objects.create(value=10.0)
+    contract_service.calculate_iapp_contract(contract["id"], percentage.id)
+    return contract
+
+
+@pytest.mark.django_db
+def test_return_iapp_contract_survives_gimix_failure(contract_service, company, mocker):
+    contract = calculated_contract(contract_service, company, mocker)
+    mocker.patch.object(contract_service.iapp_service, "update_contract")
+    mocker.patch.object(
+        contract_service.gimix_service,
+        "get_margin_admins_email",
+        side_effect=HttpError(500, "Erro de conexão com o GIMIx."),
+    )
+
+    result = contract_service.return_iapp_contract(
+        contract["id"], "user@gimi.com.br", "token"
+    )
+
+    stages = {stage["stage"]: stage for stage in result["stages"]}
+    assert stages["iapp"]["status"] == "ok"
+    assert stages["recipients"] == {
+        "stage": "recipients",
+        "status": "failed",
+        "detail": "Erro de conexão com o GIMIx.",
+    }
+    assert EmailOutbox.objects.get().recipients == ["user@gimi.com.br"]
+
+
+@pytest.mark.django_db
+def test_return_iapp_contract_reports_iapp_failure(contract_service, company, mocker):
+    contract = calculated_contract(contract_service, company, mocker)
+    mocker.patch.object(
+        contract_service.iapp_service,
+        "update_contract",
+        side_effect=HttpError(500, "Erro 503: Instabilidade no iApp."),
+    )
+    mocker.patch.object(
+        contract_service.gimix_service, "get_margin_admins_email", return_value=[]
+    )
+
+    with pytest.raises(HttpError) as exc:
+        contract_service.return_iapp_contract(
+            contract["id"], "user@gimi.com.br", "token"
+        )
+
+    assert exc.value.status_code == 500
+    assert "iApp" in exc.value.message
+    assert not EmailOutbox.objects.exists()
+
+
+@pytest.mark.django_db
+def test_return_iapp_contract_enforces_deadline(contract_service, company, mocker):
+    contract = calculated_contract(contract_service, company, mocker)
+    mocker.patch.object(
+        contract_service.iapp_service,
+        "update_contract",
+        side_effect=lambda *args: time.sleep(0.5),
+    )
+    mocker.patch.object(
+        contract_service.gimix_service, "get_margin_admins_email", return_value=[]
+    )
+    contract_service.RETURN_DEADLINE = 0.05
+
+    started = time.monotonic()
+    with pytest.raises(HttpError) as exc:
+        contract_service.return_iapp_contract(
+            contract["id"], "user@gimi.com.br", "token"
+        )
+
+    assert time.monotonic() - started < 0.5
+    assert exc.value.status_code == 504
+
+
+@pytest.mark.django_db
+def test_return_iapp_contracts_reports_each_contract(contract_service, company, mocker):
+    def get_contract(_, contract):
+        return [iapp_contract(contract_id=int(contract[2:]), number=contract)]
+
+    mocker.patch.object(
+        contract_service.iapp_service, "get_contract", side_effect=get_contract
+    )
+    found = contract_service.find_iapp_contracts(company.id, ["C-1", "C-2", "C-3"])
+    ids = [contract["id"] for contract in found["contracts"]]
+    percentage = Percentage.objects.create(value=10.0)
+    for contract_id in ids[:2]:
+        contract_service.calculate_iapp_contract(contract_id, percentage.id)
+
+    running = []
+    peak = []
+
+    def update_contract(_, contract_id, payload):
+        running.append(contract_id)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.remove(contract_id)
+        if contract_id == 2:
+            raise HttpError(500, "Erro 503: Instabilidade no iApp.")
+
+    mocker.patch.object(
+        contract_service.iapp_service, "update_contract", side_effect=update_contract
+    )
+    get_admins = mocker.patch.object(
+        contract_service.gimix_service,
+        "get_margin_admins_email",
+        return_value=["admin@gimi.com.br"],
+    )
+    contract_service.MAX_RETURN_WORKERS_PER_COMPANY = 1
+
+    result = contract_service.return_iapp_contracts(
+        [*ids, ids[0]], "user@gimi.com.br", "token"
+    )
+
+    assert [c["contract_number"] for c in result["contracts"]] == ["C-1"]
+    assert result["errors"] == [
+        {"contract": str(ids[2]), "status": 400, "detail": "Contrato não calculado."},
+        {
+            "contract": str(ids[1]),
+            "status": 500,
+            "detail": "Erro 503: Instabilidade no iApp.",
+        },
+    ]
+    assert max(peak) == 1
+    get_admins.assert_called_once_with("token")
+    email = EmailOutbox.objects.get()
+    assert email.subject == "App Margem - Retorno de 1 contratos"
+    assert email.recipients == ["admin@gimi.com.br", "user@gimi.com.br"]
+    assert "C-1" in email.body and "C-2" not in email.body
+
+
+@pytest.mark.django_db
+def test_contract_aggregate_is_loaded_in_two_queries(
+    contract_service, company, mocker, django_assert_num_queries
+):
+    contract = calculated_contract(contract_service, company, mocker)
+    ContractItem.objects.filter(index=1).update(index=3)
+
+    with django_assert_num_queries(2):
+        loaded = contract_service.get_contract_by_id(contract["id"])
+        payload = contract_service._prepare_update_payload(loaded)
+        contract_service.email_service.build_margin_email(loaded)
+        assert (loaded.company.name, loaded.state.code, loaded.margin.value) == (
+            "GIMI",
+            "PR",
+            10.0,
+        )
+
+    assert [item["id"] for item in payload["produtos"]] == [101, 100]
@@ -0,0 +1,148 @@
+from io import StringIO
+from smtplib import SMTPServerDisconnected
+
+import pytest
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import OperationalError
+from django.utils import timezone
+
+from utils.formatters import format_brl, format_rate
+
+from apps.icms.models import NCM, ICMSRate, State
+from apps.margin.models import Company, Contract, ContractItem, EmailOutbox, Percentage
+from apps.margin.services.email_service import EmailService
+
+
+@pytest.fixture
+def email_service(settings):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    return EmailService()
+
+
+def queue_email(subject="Contrato C-1"):
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=subject,
+        html_body=f"<p>{subject}</p>",
+        from_email="margem@gimi.com.br",
+        recipients=["admin@gimi.com.br"],
+    )
+
+
+@pytest.mark.django_db
+def test_send_outbox_delivers_due_emails(email_service):
+    for number in range(3):
+        queue_email(f"Contrato C-{number}")
+
+    assert email_service.send_outbox() == {"sent": 3, "retried": 0}
+    assert len(mail.outbox) == 3
+    assert mail.outbox[0].alternatives[0][1] == "text/html"
+    assert not EmailOutbox.objects.exclude(status="sent").exists()
+    assert email_service.send_outbox() == {"sent": 0, "retried": 0}
+
+
+@pytest.mark.django_db
+def test_send_outbox_retries_with_backoff(email_service, mocker):
+    email = queue_email()
+    mocker.patch(
+        "django.core.mail.EmailMultiAlternatives.send",
+        side_effect=SMTPServerDisconnected("Connection unexpectedly closed"),
+    )
+
+    assert email_service.send_outbox() == {"sent": 0, "retried": 1}
+    email.refresh_from_db()
+    assert (email.status, email.attempts) == ("pending", 1)
+    assert email.next_attempt_at > timezone.now()
+    assert "unexpectedly closed" in email.last_error
+
+    email.attempts = email_service.MAX_ATTEMPTS - 1
+    email.next_attempt_at = timezone.now()
+    email.save()
+    email_service.send_outbox()
+    email.refresh_from_db()
+    assert email.status == "failed"
+
+
+@pytest.mark.django_db
+def test_send_outbox_retries_when_smtp_is_down(email_service, mocker):
+    first, second = queue_email("Contrato C-1"), queue_email("Contrato C-2")
+    connection = get_connection()
+    mocker.patch.object(
+        connection,
+        "open",
+        side_effect=[ConnectionRefusedError("Connection refused"), None],
+    )
+
+    assert email_service.send_outbox(connection=connection) == {
+        "sent": 1,
+        "retried": 1,
+    }
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.status, first.attempts) == ("pending", 1)
+    assert "refused" in first.last_error
+    assert second.status == "sent"
+
+
+@pytest.mark.django_db
+def test_send_outbox_emails_keeps_polling_after_errors(mocker):
+    send_outbox = mocker.patch.object(
+        EmailService,
+        "send_outbox",
+        side_effect=[
+            OperationalError("server closed the connection"),
+            KeyboardInterrupt,
+        ],
+    )
+    mocker.patch("apps.margin.management.commands.send_outbox_emails.time.sleep")
+    stderr = StringIO()
+
+    with pytest.raises(KeyboardInterrupt):
+        call_command("send_outbox_emails", stderr=stderr)
+
+    assert send_outbox.call_count == 2
+    assert "server closed the connection" in stderr.getvalue()
+
+
+def test_formatters_follow_pt_br():
+    assert format_brl(1234567.891) == "R$\xa01.234.567,89"
+    assert format_brl(-0.5) == "-R$\xa00,50"
+    assert format_rate(18) == "18,00%"
+    assert format_rate(1234.5) == "1234,50%"
+
+
+def test_build_margin_email_renders_html_and_text(email_service):
+    contract = Contract(
+        contract_id=7,
+        contract_number="C-7",
+        company=Company(name="GIMI"),
+        client_name="Cliente <A&B>",
+        construction_name="Obra",
+        net_cost=1000.0,
+        net_cost_without_taxes=900.0,
+        net_cost_with_margin=1500.0,
+        freight_value=50.0,
+        commission=2.5,
+        state=State(name="Paraná", code="PR"),
+        ncm=NCM(code="8504.40.90"),
+        icms=ICMSRate(total_rate=18),
+        other_taxes=9.25,
+        margin=Percentage(value=15),
+    )
+    items = [
+        ContractItem(index=1, name="Painel", contribution_rate=60, updated_value=900),
+        ContractItem(index=2, name="Cabo", contribution_rate=40, updated_value=600),
+    ]
+
+    subject, text, html = email_service.build_margin_email(contract, items)
+
+    assert subject == "App Margem - Retorno do Contrato C-7 (GIMI)"
+    assert "Cliente &lt;A&amp;B&gt;" in html
+    assert "<td>Cabo</td>" in html
+    assert "<td>R$\xa0900,00</td>" in html
+    assert "editar?id=7" in html
+    assert "Cliente <A&B>" in text
+    assert "- Margem: 15,00%" in text
+    assert "2. Cabo - contribuição 40,00% - valor unitário R$\xa0600,00" in text
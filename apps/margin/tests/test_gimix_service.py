@@ -0,0 +1,73 @@
+import time
+from http import HTTPStatus
+
+import pytest
+from ninja.errors import HttpError
+
+from utils.gimix_service import CachedEmails, GIMIxService
+
+
+@pytest.fixture
+def gimix_service(settings):
+    settings.GIMIX_RECIPIENTS_TTL = 60
+    settings.GIMIX_RECIPIENTS_STALE_TTL = 600
+    GIMIxService._emails_by_audience.clear()
+    yield GIMIxService()
+    GIMIxService._emails_by_audience.clear()
+
+
+def cache_emails(emails, age):
+    GIMIxService._emails_by_audience["margin_admins"] = CachedEmails(
+        tuple(emails), time.monotonic() - age
+    )
+
+
+def gimix_down():
+    return HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, "Erro de conexão com o GIMIx.")
+
+
+def test_margin_admins_are_fetched_once_within_ttl(gimix_service, mocker):
+    send_request = mocker.patch.object(
+        gimix_service, "send_request", return_value=["admin@gimi.com.br"]
+    )
+
+    first = gimix_service.get_margin_admins_email("token")
+    first.append("user@gimi.com.br")
+
+    assert gimix_service.get_margin_admins_email("token") == ["admin@gimi.com.br"]
+    send_request.assert_called_once()
+
+
+def test_stale_margin_admins_are_served_while_refreshing(gimix_service, mocker):
+    cache_emails(["old@gimi.com.br"], age=120)
+    refresh = mocker.patch.object(gimix_service, "_refresh_in_background")
+
+    assert gimix_service.get_margin_admins_email("token") == ["old@gimi.com.br"]
+    refresh.assert_called_once_with("margin_admins", "token")
+
+
+def test_background_refresh_replaces_stale_list(gimix_service, mocker):
+    cache_emails(["old@gimi.com.br"], age=120)
+    mocker.patch.object(gimix_service, "send_request", return_value=["new@gimi.com.br"])
+
+    gimix_service.get_margin_admins_email("token")
+    for _ in range(100):
+        if "margin_admins" not in GIMIxService._refreshing:
+            break
+        time.sleep(0.01)
+
+    assert gimix_service.get_margin_admins_email("token") == ["new@gimi.com.br"]
+
+
+def test_last_known_margin_admins_are_used_when_gimix_is_down(gimix_service, mocker):
+    cache_emails(["old@gimi.com.br"], age=3600)
+    mocker.patch.object(gimix_service, "send_request", side_effect=gimix_down())
+
+    assert gimix_service.get_margin_admins_email("token") == ["old@gimi.com.br"]
+
+
+def test_cold_cache_raises_when_gimix_is_down(gimix_service, mocker):
+    mocker.patch.object(gimix_service, "send_request", side_effect=gimix_down())
+
+    with pytest.raises(HttpError):
+        gimix_service.get_margin_admins_email("token")
@@ -0,0 +1,36 @@
+import pytest
+
+from apps.margin import pricing
+
+
+def test_sale_prices_round_up_to_whole_units():
+    prices = pricing.sale_prices(
+        [1000.0, 900.0], [100.0, 100.0], [18.0, 18.0], [2.0, 2.0], [0, 0], [0, 10.0]
+    )
+    assert prices == [1375, 1429]
+
+
+def test_sale_prices_keep_exact_whole_prices():
+    assert pricing.sale_prices([75.0], [25.0], [0], [0], [0], [50.0]) == [200]
+    assert pricing.sale_prices(
+        [1000.004, 1000.006], [0, 0], [0, 0], [0, 0], [0, 0], [0, 0]
+    ) == [1000, 1001]
+
+
+def test_sale_prices_reject_rates_of_100_percent():
+    with pytest.raises(pricing.InvalidMarkupError) as exc_info:
+        pricing.sale_prices([1.0, 1.0], [0, 0], [18, 18], [2, 2], [0, 5], [10, 75])
+    assert exc_info.value.index == 1
+
+
+def test_item_values_add_up_to_sale_price():
+    values = pricing.item_values(1001, [50.0, 33.3, 16.7])
+    assert values[0] == 500.5
+    assert sum(values) == pytest.approx(1001)
+
+
+def test_implied_margins_invert_sale_prices():
+    margins = pricing.implied_margins(
+        [1000.0, 900.0], [100.0, 100.0], [18.0, 18.0], [2.0, 2.0], [0, 0], [1375, 1250]
+    )
+    assert margins == pytest.approx([0.0, 0.0])
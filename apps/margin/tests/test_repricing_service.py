@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from apps.icms.models import NCM, ICMSRate, NCMGroup, State
+from apps.margin.models import (
+    Company,
+    Contract,
+    ContractItem,
+    Percentage,
+    RepricingJob,
+)
+from apps.margin.services.contract_service import ContractService
+from apps.margin.services.repricing_service import RepricingService
+from apps.taxes.models import Tax
+
+
+@pytest.fixture
+def repricing_service():
+    return RepricingService()
+
+
+@pytest.fixture
+def contracts():
+    state = State.objects.create(name="Paraná", code="PR")
+    group = NCMGroup.objects.create(name="Group 1")
+    ncm = NCM.objects.create(code="8504.40.90", group=group)
+    rate = ICMSRate.objects.create(
+        state=state,
+        group=group,
+        internal_rate=12,
+        difal_rate=6,
+        poverty_rate=0,
+        valid_from=date(2024, 1, 1),
+    )
+    Tax.objects.create(name="PIS", presumed_profit_rate=0.65, real_profit_rate=1.65)
+    company = Company.objects.create(name="GIMI", profit_type="real")
+    margin = Percentage.objects.create(value=10)
+
+    contracts = []
+    for number in range(3):
+        contract = Contract.objects.create(
+            contract_id=number,
+            contract_number=f"C-{number}",
+            company=company,
+            client_name="Client",
+            client_id=1,
+            construction_name="Construction",
+            delivery_date=date(2025, 1, 31),
+            net_cost=1000.0 * (number + 1),
+            net_cost_without_taxes=0,
+            net_cost_with_margin=0,
+            freight_value=100.0,
+            commission=2.5,
+            state=state,
+            ncm=ncm,
+            icms=rate,
+            other_taxes=0,
+            account=1,
+            installments=1,
+            xped="N/A",
+            margin=margin,
+        )
+        for index in (1, 2):
+            ContractItem.objects.create(
+                contract=contract,
+                index=index,
+                name=f"Product {index}",
+                contribution_rate=50.0,
+                sale_item_id=index,
+                quantity=1,
+                product_id=index,
+            )
+        contracts.append(contract)
+    return contracts
+
+
+@pytest.mark.django_db
+def test_reprice_matches_contract_calculation(repricing_service, contracts):
+    rate = ICMSRate.objects.get()
+    job = repricing_service.create_job(
+        "test", state_groups=[(rate.state_id, rate.group_id)]
+    )
+    job = repricing_service.run(job.pk, chunk_size=2)
+
+    assert (job.status, job.processed, job.failed, job.total) == ("completed", 3, 0, 3)
+    repriced = {
+        contract.pk: contract.net_cost_with_margin
+        for contract in Contract.objects.all()
+    }
+    items = {item.pk: item.updated_value for item in ContractItem.objects.all()}
+
+    for contract in contracts:
+        calculated = ContractService().calculate_iapp_contract(
+            contract.pk, contract.margin_id
+        )
+        assert repriced[contract.pk] == calculated["net_cost_with_margin"]
+        for item in calculated["items"]:
+            assert items[item["id"]] == pytest.approx(item["updated_value"])
+
+
+@pytest.mark.django_db
+def test_reprice_resumes_after_interruption(repricing_service, contracts):
+    job = repricing_service.create_job("test")
+
+    def interrupt(job):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        repricing_service.run(job.pk, chunk_size=1, progress=interrupt)
+
+    job.refresh_from_db()
+    assert (job.status, job.processed) == ("running", 1)
+
+    job = repricing_service.run(job.pk, chunk_size=1)
+    assert (job.status, job.processed, job.total) == ("completed", 3, 3)
+    assert not ContractItem.objects.filter(updated_value__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_reprice_resumes_jobs_whose_worker_died(repricing_service, contracts):
+    stale = timezone.now() - RepricingService.HEARTBEAT_TIMEOUT - timedelta(minutes=1)
+    live = repricing_service.create_job("live")
+    dead = repricing_service.create_job("dead")
+    RepricingJob.objects.filter(pk=live.pk).update(
+        status="running", heartbeat_at=timezone.now()
+    )
+    RepricingJob.objects.filter(pk=dead.pk).update(status="running", heartbeat_at=stale)
+
+    assert list(repricing_service.resumable_jobs()) == [dead]
+    with pytest.raises(HttpError) as error:
+        repricing_service.run(live.pk)
+    assert error.value.status_code == 409
+
+    call_command("reprice_contracts", "--pending")
+    live.refresh_from_db()
+    dead.refresh_from_db()
+    assert (live.status, dead.status) == ("running", "completed")
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from apps.margin.services.repricing_service import RepricingService
 from apps.taxes.models import Tax
 
 
@@ -9,3 +10,11 @@ class TaxAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     ordering = ("name",)
     list_filter = ("presumed_profit_rate", "real_profit_rate")
+    actions = ["reprice_contracts"]
+
+    @admin.action(description="Reprecificar todos os contratos")
+    def reprice_contracts(self, request, queryset):
+        service = RepricingService()
+        job = service.create_job("Alteração de impostos")
+        service.start_in_background(job)
+        self.message_user(request, f"Reprecificação {job.pk} iniciada.")
@@ -1,7 +1,7 @@
 import uuid
 from http import HTTPStatus
 
-from ninja import Router
+from ninja import Query, Router
 
 from apps.taxes.schema import (
     TaxByCompanySchema,
@@ -11,8 +11,9 @@ from apps.taxes.schema import (
     TaxUpdateSchema,
 )
 from apps.taxes.service import TaxesService
-from utils.base_schema import ErrorSchema
+from utils.base_schema import ErrorSchema, PaginationQuerySchema
 from utils.jwt import JWTAuth, decode_jwt_token
+from utils.query_budget import query_budget
 
 taxes_router = Router(auth=JWTAuth())
 service = TaxesService()
@@ -32,12 +33,21 @@ def create_tax(request, payload: TaxCreateSchema):
     return service.create_tax(jwt, payload)
 
 
+# One query for the page; count and totals come from the reference cache, whose
+# cold load takes the other seven.
 @taxes_router.get(
-    "", response={HTTPStatus.OK: TaxListSchema, HTTPStatus.FORBIDDEN: ErrorSchema}
+    "",
+    response={
+        HTTPStatus.OK: TaxListSchema,
+        HTTPStatus.FORBIDDEN: ErrorSchema,
+        HTTPStatus.BAD_REQUEST: ErrorSchema,
+    },
 )
-def list_taxes(request):
+# The list, plus the reference cache's periodic version check.
+@query_budget(2)
+def list_taxes(request, page: PaginationQuerySchema = Query(...)):
     decode_jwt_token(request.headers.get("Authorization"))
-    return service.list_taxes()
+    return service.list_taxes(**page.dict())
 
 
 @taxes_router.get(
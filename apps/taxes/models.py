@@ -12,15 +12,17 @@ class Tax(BaseModel):
         return str(self.name)
 
     @classmethod
-    def total_presumed_profit_rate(cls):
-        return (
-            cls.objects.aggregate(total=models.Sum("presumed_profit_rate"))["total"]
-            or 0
+    def summary(cls):
+        summary = cls.objects.aggregate(
+            count=models.Count("id"),
+            total_presumed_profit_rate=models.Sum("presumed_profit_rate"),
+            total_real_profit_rate=models.Sum("real_profit_rate"),
         )
-
-    @classmethod
-    def total_real_profit_rate(cls):
-        return cls.objects.aggregate(total=models.Sum("real_profit_rate"))["total"] or 0
+        return {
+            "count": summary["count"],
+            "total_presumed_profit_rate": summary["total_presumed_profit_rate"] or 0,
+            "total_real_profit_rate": summary["total_real_profit_rate"] or 0,
+        }
 
     @classmethod
     def list_taxes_by_company(cls, company):
@@ -15,7 +15,8 @@ class TaxSchema(TaxCreateSchema):
 
 
 class TaxListSchema(Schema):
-    count: int
+    count: Optional[int] = None
+    next_cursor: Optional[str] = None
     total_presumed_profit_rate: float
     total_real_profit_rate: float
     taxes: list[TaxSchema]
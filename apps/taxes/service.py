@@ -1,5 +1,6 @@
 import uuid
 from http import HTTPStatus
+from typing import Optional
 
 from django.db import IntegrityError
 from django.http import JsonResponse
@@ -8,6 +9,8 @@ from ninja.errors import HttpError
 from apps.margin.services.company_service import CompanyService
 from apps.taxes.models import Tax
 from apps.taxes.schema import TaxCreateSchema, TaxUpdateSchema
+from utils.pagination import DEFAULT_LIMIT, paginate
+from utils.reference_cache import reference_cache
 from utils.validation import ValidationService
 
 
@@ -27,15 +30,21 @@ class TaxesService:
         return Tax.objects.count()
 
     @staticmethod
-    def list_taxes():
-        taxes = Tax.objects.all()
-        count = taxes.count()
-
+    def list_taxes(
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_LIMIT,
+        with_count: bool = True,
+    ):
+        # The cached summary already carries the exact count.
+        summary = reference_cache.get_tax_summary()
+        page = paginate(
+            Tax.objects.all(), ("name", "id"), cursor, limit, with_count=False
+        )
         return {
-            "count": count,
-            "total_presumed_profit_rate": Tax.total_presumed_profit_rate(),
-            "total_real_profit_rate": Tax.total_real_profit_rate(),
-            "taxes": taxes,
+            **summary,
+            "count": summary["count"] if with_count else None,
+            "next_cursor": page.next_cursor,
+            "taxes": page.items,
         }
 
     def get_tax(self, tax_id: uuid.UUID):
@@ -33,3 +33,18 @@ def test_list_taxes(taxes_service):
 def test_get_tax_not_found(taxes_service):
     with pytest.raises(HttpError):
         taxes_service.get_tax(uuid.uuid4())
+
+
+@pytest.mark.django_db
+def test_list_taxes_summary(taxes_service, django_assert_num_queries):
+    Tax.objects.create(name="Tax 3", presumed_profit_rate=1.5, real_profit_rate=2.0)
+    Tax.objects.create(name="Tax 4", presumed_profit_rate=3.0, real_profit_rate=4.5)
+    taxes_service.list_taxes()
+
+    with django_assert_num_queries(1):
+        taxes = taxes_service.list_taxes()
+        assert len(taxes["taxes"]) == 2
+
+    assert taxes["count"] == 2
+    assert taxes["total_presumed_profit_rate"] == 4.5
+    assert taxes["total_real_profit_rate"] == 6.5
@@ -0,0 +1,127 @@
+"""Render the contract return email for a 500-item contract.
+
+Compares the f-string builder EmailService used before with the cached
+Django templates. Run from the repository root::
+
+    python -m benchmarks.bench_email
+"""
+
+import os
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("POSTGRES_URL", "sqlite://:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+django.setup()
+
+from babel.numbers import format_currency, format_percent  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+
+from apps.icms.models import NCM, ICMSRate, State  # noqa: E402
+from apps.margin.models import (  # noqa: E402
+    Company,
+    Contract,
+    ContractItem,
+    Percentage,
+)
+from apps.margin.services.email_service import EmailService  # noqa: E402
+
+ITEMS = 500
+
+
+def build_contract():
+    contract = Contract(
+        contract_id=123,
+        contract_number="C-123",
+        company=Company(name="GIMI"),
+        client_name="Client",
+        construction_name="Construction",
+        net_cost=1_250_000.0,
+        net_cost_without_taxes=1_100_000.0,
+        net_cost_with_margin=1_600_000.0,
+        freight_value=12_000.0,
+        commission=2.5,
+        state=State(name="Paraná", code="PR"),
+        ncm=NCM(code="8504.40.90"),
+        icms=ICMSRate(total_rate=18),
+        other_taxes=9.25,
+        margin=Percentage(value=15),
+    )
+    items = [
+        ContractItem(
+            index=index,
+            name=f"Product {index}",
+            contribution_rate=100 / ITEMS,
+            updated_value=1_600_000.0 / ITEMS,
+        )
+        for index in range(1, ITEMS + 1)
+    ]
+    return contract, items
+
+
+def legacy_body(contract, items):
+    """The details and item table as the f-string builder produced them."""
+    freight = format_currency(contract.freight_value, "BRL", locale="pt_BR")
+    commission = format_percent(
+        contract.commission / 100, format="0.00%", locale="pt_BR"
+    )
+    icms = format_percent(
+        contract.icms.total_rate / 100, format="0.00%", locale="pt_BR"
+    )
+    other_taxes = format_percent(
+        contract.other_taxes / 100, format="0.00%", locale="pt_BR"
+    )
+    margin = format_percent(contract.margin.value / 100, format="0.00%", locale="pt_BR")
+    net_cost = format_currency(contract.net_cost, "BRL", locale="pt_BR")
+    email_body = f"""
+        <ul>
+            <li><strong>Número:</strong> {contract.contract_number}</li>
+            <li><strong>Frete:</strong> {freight}</li>
+            <li><strong>Comissão:</strong> {commission}</li>
+            <li><strong>ICMS:</strong> {icms}</li>
+            <li><strong>Outros impostos:</strong> {other_taxes}</li>
+            <li><strong>Margem:</strong> {margin}</li>
+            <li><strong>Custo líquido:</strong> {net_cost}</li>
+        </ul>
+        <table><tbody>
+    """
+    for item in items:
+        email_body += f"""
+                <tr>
+                    <td>{item.index}</td>
+                    <td>{item.name}</td>
+                    <td>{format_percent(item.contribution_rate / 100, format="0.00%", locale="pt_BR")}</td>
+                    <td>{format_currency(item.updated_value, "BRL", locale="pt_BR")}</td>
+                </tr>
+        """
+    email_body += "</tbody></table>"
+    return email_body
+
+
+def main():
+    contract, items = build_contract()
+    service = EmailService()
+    service.build_margin_email(contract, items)  # compile the templates once
+
+    context = {"contract": contract, "items": items}
+    cases = {
+        "f-string builder, HTML": lambda: legacy_body(contract, items),
+        "cached template, HTML": lambda: render_to_string(
+            "margin/email/contract_returned.html", context
+        ),
+        "build_margin_email, HTML + text": lambda: service.build_margin_email(
+            contract, items
+        ),
+    }
+
+    runs = 20
+    print(f"{ITEMS} items, best mean of {runs} renders")
+    for name, function in cases.items():
+        elapsed = min(timeit.repeat(function, number=runs)) / runs
+        print(f"{name:<32} {elapsed * 1_000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
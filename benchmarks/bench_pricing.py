@@ -0,0 +1,96 @@
+"""Compare the pricing kernel with the per-contract loop it replaced.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_pricing
+"""
+
+import functools
+import random
+import timeit
+
+from apps.margin import pricing
+
+SIZES = (10, 1_000, 100_000)
+ITEMS_PER_CONTRACT = 4
+
+
+def build_rows(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [
+        {
+            "net_cost_without_taxes": rng.uniform(1_000, 500_000),
+            "freight_value": rng.uniform(0, 5_000),
+            "icms": rng.choice((7.0, 12.0, 17.0, 18.0, 20.5)),
+            "other_taxes": 9.25,
+            "commission": rng.choice((0.0, 1.5, 2.5)),
+            "margin": rng.choice((10.0, 15.0, 20.0)),
+            "contribution_rates": [100 / ITEMS_PER_CONTRACT] * ITEMS_PER_CONTRACT,
+        }
+        for _ in range(size)
+    ]
+
+
+def legacy_loop(rows):
+    """The formula as calculate_iapp_contract evaluated it, one contract at a time."""
+    results = []
+    for row in rows:
+        sale_price = (
+            float(row["net_cost_without_taxes"]) + float(row["freight_value"])
+        ) / (
+            1
+            - (float(row["icms"]) / 100)
+            - (float(row["other_taxes"]) / 100)
+            - (float(row["margin"]) / 100)
+            - (float(row["commission"]) / 100)
+        )
+        sale_price = round(sale_price + 0.5)
+        results.append(
+            [(sale_price * rate) / 100 for rate in row["contribution_rates"]]
+        )
+    return results
+
+
+def kernel(columns, contribution_rates):
+    prices = pricing.sale_prices(*columns)
+    return [
+        pricing.item_values(price, rates)
+        for price, rates in zip(prices, contribution_rates)
+    ]
+
+
+def to_columns(rows):
+    keys = (
+        "net_cost_without_taxes",
+        "freight_value",
+        "icms",
+        "other_taxes",
+        "commission",
+        "margin",
+    )
+    return [[row[key] for row in rows] for key in keys], [
+        row["contribution_rates"] for row in rows
+    ]
+
+
+def best_of(function, repeat: int = 5) -> float:
+    number = max(1, 100_000 // max(function.size, 1))
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    print(f"{'rows':>8} {'legacy (ms)':>12} {'kernel (ms)':>12} {'ratio':>7}")
+    for size in SIZES:
+        rows = build_rows(size)
+        columns, contribution_rates = to_columns(rows)
+
+        run_legacy = functools.partial(legacy_loop, rows)
+        run_kernel = functools.partial(kernel, columns, contribution_rates)
+        run_legacy.size = run_kernel.size = size
+        legacy = best_of(run_legacy) * 1_000
+        current = best_of(run_kernel) * 1_000
+        print(f"{size:>8} {legacy:>12.3f} {current:>12.3f} {legacy / current:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import pytest
+
+from utils.reference_cache import reference_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_reference_cache():
+    reference_cache.invalidate()
+    yield
+    reference_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    settings.QUERY_BUDGET_ENFORCED = True
@@ -59,8 +59,12 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "utils.query_budget.QueryBudgetMiddleware",
 ]
 
+# Fail requests that run more queries than their endpoint's @query_budget.
+QUERY_BUDGET_ENFORCED = str(os.getenv("QUERY_BUDGET_ENFORCED")) == "True"
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -156,3 +160,8 @@ EMAIL_USE_TLS = True
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_HOST_USER = str(os.getenv("EMAIL_HOST_USER"))
 EMAIL_HOST_PASSWORD = str(os.getenv("EMAIL_HOST_PASSWORD"))
+
+# GIMIx
+
+GIMIX_RECIPIENTS_TTL = int(os.getenv("GIMIX_RECIPIENTS_TTL", "300"))
+GIMIX_RECIPIENTS_STALE_TTL = int(os.getenv("GIMIX_RECIPIENTS_STALE_TTL", "3600"))
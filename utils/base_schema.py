@@ -1,5 +1,15 @@
+from typing import Optional
+
 from ninja import Schema
 
+from utils.pagination import DEFAULT_LIMIT
+
 
 class ErrorSchema(Schema):
     detail: str
+
+
+class PaginationQuerySchema(Schema):
+    cursor: Optional[str] = None
+    limit: int = DEFAULT_LIMIT
+    with_count: bool = True
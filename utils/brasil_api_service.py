@@ -12,3 +12,10 @@ class BrasilAPIService:
             return response.json()
 
         return None
+
+    def list_ncms(self):
+        url = f"{self.BASE_URL}/ncm/v1"
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+
+        return response.json()
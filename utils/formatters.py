@@ -0,0 +1,29 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+# pt_BR groups thousands with "." and separates decimals with ",". Formatting
+# directly is an order of magnitude cheaper than babel's pattern machinery,
+# which re-reads locale data on every call. The output is the same as
+# format_currency(value, "BRL", locale="pt_BR") and format_percent(value / 100,
+# format="0.00%", locale="pt_BR"), except that a rate on an exact half cent is
+# rounded half-even from its stored value instead of from the float quotient.
+CENT = Decimal("0.01")
+PT_BR_SEPARATORS = str.maketrans(",.", ".,")
+
+
+def format_decimal(value, grouping: bool = True) -> str:
+    """1234.5 -> '1.234,50'"""
+    number = Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_EVEN)
+    return format(number, ",f" if grouping else "f").translate(PT_BR_SEPARATORS)
+
+
+def format_brl(value) -> str:
+    """1234.5 -> 'R$ 1.234,50'"""
+    formatted = format_decimal(value)
+    if formatted.startswith("-"):
+        return "-R$\xa0" + formatted[1:]
+    return "R$\xa0" + formatted
+
+
+def format_rate(value) -> str:
+    """A rate stored in percent points: 18 -> '18,00%'"""
+    return format_decimal(value, grouping=False) + "%"
@@ -1,31 +1,134 @@
+import threading
+import time
 import uuid
+from dataclasses import dataclass
+from http import HTTPStatus
 
 import requests
+from django.conf import settings
+from ninja.errors import HttpError
+from requests.adapters import HTTPAdapter
+
+
+@dataclass(frozen=True)
+class CachedEmails:
+    emails: tuple[str, ...]
+    fetched_at: float
 
 
 class GIMIxService:
-    def __init__(self):
-        self.base_url = "https://gimix-api.vercel.app/api"
+    """Client for the GIMIx user directory.
+
+    Recipient lists are cached per audience for ``GIMIX_RECIPIENTS_TTL``
+    seconds. For ``GIMIX_RECIPIENTS_STALE_TTL`` seconds after that the cached
+    list is still returned while a background thread fetches a fresh one, so
+    callers only wait for GIMIx on a cold cache. When GIMIx can't be reached
+    the last known list is returned, however old it is.
+    """
+
+    BASE_URL = "https://gimix-api.vercel.app/api"
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 5
+    POOL_CONNECTIONS = 1
+    POOL_MAXSIZE = 8
+    AUDIENCES = {"margin_admins": "users/emails?is_margin_admin=true"}
+
+    _session = None
+    _session_lock = threading.Lock()
+    _emails_by_audience: dict[str, CachedEmails] = {}
+    _refreshing: set[str] = set()
+    _cache_lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    adapter = HTTPAdapter(
+                        pool_connections=cls.POOL_CONNECTIONS,
+                        pool_maxsize=cls.POOL_MAXSIZE,
+                    )
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    cls._session = session
+        return cls._session
 
     def send_request(self, endpoint: str, method: str, token: str):
-        url = f"{self.base_url}/{endpoint}"
+        url = f"{self.BASE_URL}/{endpoint}"
         headers = {"Authorization": f"Bearer {token}"}
 
-        response = requests.request(method, url, headers=headers, timeout=10)
-        response.raise_for_status()
-        json_response = response.json()
+        try:
+            response = self.get_session().request(
+                method,
+                url,
+                headers=headers,
+                timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT),
+            )
+        except requests.Timeout as exc:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                "Tempo de resposta do GIMIx excedido.",
+            ) from exc
+        except requests.RequestException as exc:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR, "Erro de conexão com o GIMIx."
+            ) from exc
 
-        return json_response
+        if not response.ok:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                f"Erro {response.status_code}: Instabilidade no GIMIx.",
+            )
+
+        return response.json()
 
     def get_user_email_by_id(self, user_id: uuid.UUID, token: str):
         endpoint = f"users/{user_id}"
-        response = self.send_request(endpoint, "GET", token)
-        json_response = response.json()
+        json_response = self.send_request(endpoint, "GET", token)
 
         return json_response["email"]
 
-    def get_margin_admins_email(self, token: str):
-        endpoint = "users/emails?is_margin_admin=true"
-        response = self.send_request(endpoint, "GET", token)
+    def get_margin_admins_email(self, token: str) -> list[str]:
+        return self.get_audience_emails("margin_admins", token)
+
+    def get_audience_emails(self, audience: str, token: str) -> list[str]:
+        cached = self._emails_by_audience.get(audience)
+        if cached is not None:
+            age = time.monotonic() - cached.fetched_at
+            ttl = settings.GIMIX_RECIPIENTS_TTL
+            if age < ttl:
+                return list(cached.emails)
+            if age < ttl + settings.GIMIX_RECIPIENTS_STALE_TTL:
+                self._refresh_in_background(audience, token)
+                return list(cached.emails)
+
+        try:
+            return list(self._fetch_emails(audience, token).emails)
+        except HttpError:
+            if cached is None:
+                raise
+            return list(cached.emails)
+
+    def _fetch_emails(self, audience: str, token: str) -> CachedEmails:
+        emails = self.send_request(self.AUDIENCES[audience], "GET", token)
+        cached = CachedEmails(tuple(emails), time.monotonic())
+        with self._cache_lock:
+            self._emails_by_audience[audience] = cached
+        return cached
+
+    def _refresh_in_background(self, audience: str, token: str):
+        with self._cache_lock:
+            if audience in self._refreshing:
+                return
+            self._refreshing.add(audience)
+
+        def target():
+            try:
+                self._fetch_emails(audience, token)
+            except HttpError:
+                pass
+            finally:
+                with self._cache_lock:
+                    self._refreshing.discard(audience)
 
-        return response
+        threading.Thread(target=target, daemon=True).start()
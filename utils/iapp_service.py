@@ -0,0 +1,125 @@
+import os
+import random
+import threading
+from http import HTTPStatus
+
+import requests
+from ninja.errors import HttpError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class JitteredRetry(Retry):
+    """Exponential backoff with full jitter, so concurrent workers don't retry in lockstep."""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+class IAppService:
+    BASE_URL = "https://api.iniciativaaplicativos.com.br/api"
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 20
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 16
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+
+    _session = None
+    _session_lock = threading.Lock()
+    _headers_by_company: dict[str, dict[str, str]] = {}
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    cls._session = cls._build_session()
+        return cls._session
+
+    @classmethod
+    def _build_session(cls) -> requests.Session:
+        # Connection errors are retried for every method (the request never reached
+        # iApp); read errors and 5xx responses only for idempotent GETs.
+        retry = JitteredRetry(
+            total=cls.MAX_RETRIES,
+            connect=cls.MAX_RETRIES,
+            read=cls.MAX_RETRIES,
+            status=cls.MAX_RETRIES,
+            allowed_methods=frozenset({"GET"}),
+            status_forcelist=(502, 503, 504),
+            backoff_factor=cls.BACKOFF_FACTOR,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=cls.POOL_CONNECTIONS,
+            pool_maxsize=cls.POOL_MAXSIZE,
+            pool_block=True,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get_headers(self, company) -> dict[str, str]:
+        if not (headers := self._headers_by_company.get(company.name)):
+            token = os.getenv(f"TOKEN_{company.name}")
+            secret = os.getenv(f"SECRET_{company.name}")
+            if not token or not secret:
+                raise HttpError(
+                    HTTPStatus.UNAUTHORIZED, "Credenciais não configuradas."
+                )
+            headers = {"TOKEN": token, "SECRET": secret}
+            self._headers_by_company[company.name] = headers
+        return headers
+
+    def send_request(self, method: str, endpoint: str, company, **kwargs):
+        url = f"{self.BASE_URL}/{endpoint}"
+
+        try:
+            response = self.get_session().request(
+                method,
+                url,
+                headers=self.get_headers(company),
+                timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT),
+                **kwargs,
+            )
+        except requests.Timeout as exc:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                "Tempo de resposta do iApp excedido.",
+            ) from exc
+        except requests.RequestException as exc:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR, "Erro de conexão com o iApp."
+            ) from exc
+
+        if not response.ok:
+            raise HttpError(
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+                f"Erro {response.status_code}: Instabilidade no iApp.",
+            )
+
+        iapp_response = response.json()
+
+        if iapp_response.get("success") is False:
+            raise HttpError(HTTPStatus.BAD_REQUEST, iapp_response.get("message"))
+
+        return iapp_response
+
+    def get_contract(self, company, contract: str):
+        params = {"offset": 1, "page": 1, "filters": f"identificacao|{contract}"}
+        iapp_response = self.send_request(
+            "GET", "comercial/contratos/lista", company, params=params
+        )
+
+        if items := iapp_response.get("response"):
+            return items
+        raise HttpError(HTTPStatus.NOT_FOUND, "Contrato não encontrado.")
+
+    def update_contract(self, company, contract_id: int, payload: dict):
+        self.send_request(
+            "PUT", f"comercial/contratos/atualiza/{contract_id}", company, json=payload
+        )
@@ -0,0 +1,98 @@
+import base64
+import json
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from ninja.errors import HttpError
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+@dataclass(frozen=True)
+class Page:
+    items: list
+    next_cursor: Optional[str]
+    count: Optional[int]
+
+    def as_dict(self, key: str) -> dict:
+        return {"count": self.count, "next_cursor": self.next_cursor, key: self.items}
+
+
+def paginate(
+    queryset: models.QuerySet,
+    ordering: tuple[str, ...],
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    with_count: bool = True,
+) -> Page:
+    """Keyset pagination over ``queryset`` sorted by ``ordering``.
+
+    ``ordering`` must identify a row uniquely, so it should end with ``id``.
+    A page is found by comparing against the last row of the previous one
+    instead of skipping rows with OFFSET, so every page costs the same however
+    deep it is. The exact count is an extra query; ``with_count=False`` skips it.
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HttpError(
+            HTTPStatus.BAD_REQUEST,
+            f"Limite inválido. Use um valor entre 1 e {MAX_LIMIT}.",
+        )
+
+    count = queryset.count() if with_count else None
+
+    if cursor is not None:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, ordering)))
+
+    items = list(queryset.order_by(*ordering)[: limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(
+            ordering, [_value(items[-1], field) for field in ordering]
+        )
+
+    return Page(items=items, next_cursor=next_cursor, count=count)
+
+
+def encode_cursor(ordering: tuple[str, ...], values: list) -> str:
+    data = json.dumps({"o": list(ordering), "v": values}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, ordering: tuple[str, ...]) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["o"] != list(ordering) or len(data["v"]) != len(ordering):
+            raise ValueError
+        return data["v"]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "Cursor inválido.") from exc
+
+
+def _after(ordering: tuple[str, ...], values: list) -> models.Q:
+    # (a, b, id) > (x, y, z) expands to a > x OR (a = x AND b > y) OR ...
+    # The database can't seek an index with that OR chain, so it is ANDed with
+    # the redundant a >= x, which gives the planner a range to start from.
+    condition = models.Q(pk__in=[])
+    equal = models.Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & models.Q(**{f"{name}__{lookup}": value})
+        equal &= models.Q(**{name: value})
+
+    first = ordering[0]
+    bound = "lte" if first.startswith("-") else "gte"
+    return models.Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & condition
+
+
+def _value(instance, field: str):
+    value = instance
+    for attribute in field.lstrip("-").split("__"):
+        value = getattr(value, attribute)
+    return value
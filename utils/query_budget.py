@@ -0,0 +1,55 @@
+import functools
+
+from django.conf import settings
+from django.db import connection
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(queries: int):
+    """Declare the most SQL queries an endpoint may run.
+
+    Place it below the router decorator. The budget covers the whole request,
+    serialization of the response included, because that is where lazy
+    relations turn into one query per row. ``QueryBudgetMiddleware`` enforces
+    it when ``QUERY_BUDGET_ENFORCED`` is on, as it is in the test suite.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.query_budget = queries
+            return view(request, *args, **kwargs)
+
+        wrapper.query_budget = queries
+        return wrapper
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENFORCED:
+            return self.get_response(request)
+
+        executed = []
+
+        def record(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.get_response(request)
+
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and len(executed) > budget:
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} ran {len(executed)} queries, "
+                f"over its budget of {budget}:\n" + "\n".join(executed)
+            )
+        return response
@@ -0,0 +1,208 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from apps.icms.models import NCM, ICMSRate, NCMGroup, ReferenceDataVersion, State
+from apps.margin.models import Company
+from apps.taxes.models import Tax
+
+
+@dataclass(frozen=True)
+class ICMSRateEntry:
+    rate: ICMSRate
+    internal_rate: Decimal
+    difal_rate: Decimal
+    poverty_rate: Decimal
+    total_rate: Decimal
+    valid_from: date
+    valid_to: Optional[date]
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    version: int
+    loaded_at: float
+    states_by_code: dict[str, State]
+    ncms_by_code: dict[str, NCM]
+    groups_by_id: dict[uuid.UUID, NCMGroup]
+    # Versions of each (state, group) pair, ordered by valid_from.
+    rate_matrix: dict[str, dict[uuid.UUID, tuple[ICMSRateEntry, ...]]]
+    companies_by_id: dict[uuid.UUID, Company]
+    tax_summary: dict[str, Decimal]
+
+
+class ReferenceDataCache:
+    """Process-local copy of the tables the pricing path reads on every request.
+
+    The snapshot is replaced as a whole, never mutated. Local writes drop it
+    through model signals; writes made by other processes are picked up by
+    comparing ``ReferenceDataVersion`` at most every ``VERSION_CHECK_INTERVAL``
+    seconds.
+    """
+
+    VERSION_CHECK_INTERVAL = 5
+    WATCHED_MODELS = (State, NCMGroup, NCM, ICMSRate, Tax, Company)
+
+    def __init__(self):
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def snapshot(self) -> ReferenceSnapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+
+        if (
+            snapshot is not None
+            and now - self._checked_at >= self.VERSION_CHECK_INTERVAL
+        ):
+            self._checked_at = now
+            if ReferenceDataVersion.current() != snapshot.version:
+                self.invalidate()
+                snapshot = None
+
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            if (snapshot := self._snapshot) is None:
+                snapshot = self._load()
+                self._snapshot = snapshot
+                self._checked_at = time.monotonic()
+            self.misses += 1
+            return snapshot
+
+    @staticmethod
+    def _load() -> ReferenceSnapshot:
+        version = ReferenceDataVersion.current()
+        groups_by_id = {group.id: group for group in NCMGroup.objects.all()}
+        ncms = list(NCM.objects.all())
+        for ncm in ncms:
+            ncm.group = groups_by_id[ncm.group_id]
+
+        versions: dict[str, dict[uuid.UUID, list[ICMSRateEntry]]] = {}
+        for rate in ICMSRate.objects.select_related("state").order_by("valid_from"):
+            rate.group = groups_by_id[rate.group_id]
+            versions.setdefault(rate.state.code, {}).setdefault(
+                rate.group_id, []
+            ).append(
+                ICMSRateEntry(
+                    rate=rate,
+                    internal_rate=rate.internal_rate,
+                    difal_rate=rate.difal_rate,
+                    poverty_rate=rate.poverty_rate,
+                    total_rate=rate.total_rate,
+                    valid_from=rate.valid_from,
+                    valid_to=rate.valid_to,
+                )
+            )
+        rate_matrix = {
+            state_code: {
+                group_id: tuple(entries) for group_id, entries in groups.items()
+            }
+            for state_code, groups in versions.items()
+        }
+
+        return ReferenceSnapshot(
+            version=version,
+            loaded_at=time.time(),
+            states_by_code={state.code: state for state in State.objects.all()},
+            ncms_by_code={ncm.code: ncm for ncm in ncms},
+            groups_by_id=groups_by_id,
+            rate_matrix=rate_matrix,
+            companies_by_id={company.id: company for company in Company.objects.all()},
+            tax_summary=Tax.summary(),
+        )
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def bump_version(self):
+        """Invalidate every process. Call after writes that skip model signals."""
+        ReferenceDataVersion.bump()
+        self.invalidate()
+        transaction.on_commit(self.invalidate)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def get_state_by_code(self, state_code: str):
+        return self.snapshot().states_by_code.get(state_code)
+
+    def get_ncm_by_code(self, ncm_code: str):
+        return self.snapshot().ncms_by_code.get(ncm_code)
+
+    def get_ncm_group(self, group_id: uuid.UUID):
+        return self.snapshot().groups_by_id.get(group_id)
+
+    def get_rate_entry(
+        self, state_code: str, ncm_code: str, as_of: Optional[date] = None
+    ):
+        snapshot = self.snapshot()
+        if not (ncm := snapshot.ncms_by_code.get(ncm_code)):
+            return None
+        return self.find_version(
+            snapshot.rate_matrix.get(state_code, {}).get(ncm.group_id, ()), as_of
+        )
+
+    @staticmethod
+    def find_version(entries: tuple[ICMSRateEntry, ...], as_of: Optional[date] = None):
+        """Return the entry in force on ``as_of`` (today by default), if any."""
+        as_of = as_of or timezone.localdate()
+        # A pair has a handful of versions; scan from the newest.
+        for entry in reversed(entries):
+            if entry.valid_from <= as_of:
+                if entry.valid_to is not None and entry.valid_to <= as_of:
+                    return None
+                return entry
+        return None
+
+    def get_company(self, company_id: uuid.UUID):
+        return self.snapshot().companies_by_id.get(company_id)
+
+    def get_tax_summary(self):
+        return self.snapshot().tax_summary
+
+    def get_tax_total(self, profit_type: str):
+        summary = self.get_tax_summary()
+        if profit_type == "real":
+            return summary["total_real_profit_rate"]
+        return summary["total_presumed_profit_rate"]
+
+
+reference_cache = ReferenceDataCache()
+
+
+def _on_reference_data_change(sender, **kwargs):
+    reference_cache.bump_version()
+
+
+def connect_signals():
+    for model in ReferenceDataCache.WATCHED_MODELS:
+        post_save.connect(
+            _on_reference_data_change,
+            sender=model,
+            dispatch_uid=f"reference_cache_{model.__name__}",
+        )
+        post_delete.connect(
+            _on_reference_data_change,
+            sender=model,
+            dispatch_uid=f"reference_cache_delete_{model.__name__}",
+        )
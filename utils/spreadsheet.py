@@ -0,0 +1,10 @@
+import csv
+from typing import Type, Union
+
+
+def sniff_csv(content: str) -> Union[Type[csv.Dialect], csv.Dialect]:
+    """Detect the delimiter spreadsheets export with (`,`, `;` or tab)."""
+    try:
+        return csv.Sniffer().sniff(content[:4096], delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
@@ -1,7 +1,10 @@
 import re
+from http import HTTPStatus
 
+from ninja.errors import HttpError
 from ninja.files import UploadedFile
 
+from apps.icms.models import NCMCatalogEntry
 from utils.brasil_api_service import BrasilAPIService
 
 
@@ -28,4 +31,28 @@ class ValidationService:
         return bool(re.match(r"^\d{4}\.\d{2}\.\d{2}$", code))
 
     def validate_ncm_code(self, code: str) -> bool:
-        return bool(self.brasil_api_service.get_ncm(code))
+        if NCMCatalogEntry.objects.filter(code=code).exists():
+            return True
+
+        # An empty catalog means load_ncm_catalog was never run on this database.
+        if not NCMCatalogEntry.objects.exists():
+            return bool(self.brasil_api_service.get_ncm(code))
+
+        return False
+
+    def validate_ncm_codes(self, codes: set[str]) -> set[str]:
+        valid_codes = set(
+            NCMCatalogEntry.objects.filter(code__in=codes).values_list(
+                "code", flat=True
+            )
+        )
+
+        # One BrasilAPI call per code would make a bulk import slow and depend on
+        # the network, so batches need the local catalog.
+        if not valid_codes and not NCMCatalogEntry.objects.exists():
+            raise HttpError(
+                HTTPStatus.BAD_REQUEST,
+                "Catálogo de NCM não carregado. Execute o comando load_ncm_catalog.",
+            )
+
+        return valid_codes